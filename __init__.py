@@ -1,69 +1,74 @@
 import os
+import io
+import importlib
 import torch
 import numpy as np
 import re
 from PIL import Image, ImageOps, ImageDraw, ImageFont
+from .matrix_profiler import profiled, phase
+from .image_utils import PRECISIONS, from_uint8_array, cast_precision
+from .matrix_cache import get_frame_cache, frame_key
+from .dataset_shards import is_shard_member, split_shard_member, read_tar_member, read_manifest, MANIFEST_SUFFIX
+from . import asset_resolver
 
 # ========================================================
-# 尝试引入子模块
+# 子模块注册表
+# 子模块在启动时全部导入 (ComfyUI 注册节点需要类本身)，它们只定义节点类；
+# 只有第三方依赖 soundfile / comfy.utils / node_helpers 由 lazy_import
+# 推迟到节点第一次执行时加载，启动时缺少这些依赖也不会让节点从列表中消失
 # ========================================================
-try:
-    from .qwen_encode import NODE_CLASS_MAPPINGS as Qwen_Mappings, NODE_DISPLAY_NAME_MAPPINGS as Qwen_Display_Mappings
-    HAS_QWEN = True
-except ImportError:
-    HAS_QWEN = False
-    print("MatrixNodes Info: qwen_encode.py not found.")
-
-try:
-    from .matrix_grid import NODE_CLASS_MAPPINGS as Grid_Mappings, NODE_DISPLAY_NAME_MAPPINGS as Grid_Display_Mappings
-    HAS_GRID = True
-except ImportError:
-    HAS_GRID = False
-    print("MatrixNodes Info: matrix_grid.py not found.")
-
-try:
-    from .video_combine import NODE_CLASS_MAPPINGS as Video_Mappings, NODE_DISPLAY_NAME_MAPPINGS as Video_Display_Mappings
-    HAS_VIDEO = True
-except ImportError:
-    HAS_VIDEO = False
-    print("MatrixNodes Info: video_combine.py not found.")
-
-try:
-    from .matrix_dataset import NODE_CLASS_MAPPINGS as Dataset_Mappings, NODE_DISPLAY_NAME_MAPPINGS as Dataset_Display_Mappings
-    HAS_DATASET = True
-except ImportError:
-    HAS_DATASET = False
-    print("MatrixNodes Info: matrix_dataset.py not found.")
+SUBMODULES = ["qwen_encode", "matrix_grid", "video_combine", "matrix_dataset"]
+
+def load_submodule_mappings(names=SUBMODULES):
+    class_mappings, display_mappings = {}, {}
+    for name in names:
+        try:
+            module = importlib.import_module(f".{name}", __name__)
+        except ImportError as e:
+            print(f"MatrixNodes Info: {name}.py could not be loaded ({e}).")
+            continue
+        class_mappings.update(getattr(module, "NODE_CLASS_MAPPINGS", {}))
+        display_mappings.update(getattr(module, "NODE_DISPLAY_NAME_MAPPINGS", {}))
+    return class_mappings, display_mappings
 
 # ========================================================
 # 1. 核心工具函数
 # ========================================================
 
-def create_placeholder(style):
+def create_placeholder(style, precision="fp32"):
     if style == "White":
-        return torch.ones((1, 512, 512, 3), dtype=torch.float32)
+        return cast_precision(torch.ones((1, 512, 512, 3), dtype=torch.float32), precision)
     else:
-        return torch.zeros((1, 512, 512, 3), dtype=torch.float32)
+        return cast_precision(torch.zeros((1, 512, 512, 3), dtype=torch.float32), precision)
 
-def create_error_image(text_content):
+def create_error_image(text_content, precision="fp32"):
     width, height = 512, 512
     img = Image.new('RGB', (width, height), color=(128, 128, 128))
     draw = ImageDraw.Draw(img)
     try: font = ImageFont.truetype("arial.ttf", 60)
     except: font = ImageFont.load_default()
     draw.text((20, 200), f"MISSING:\n{text_content}", fill=(255, 0, 0), font=font)
-    image = np.array(img).astype(np.float32) / 255.0
-    image = torch.from_numpy(image)[None,]
-    return image
+    return from_uint8_array(np.array(img), precision)
 
-def load_image_file(file_path):
+def load_image_file(file_path, precision="fp32"):
+    """
+    precision: fp32 (默认) / fp16 / uint8，见 image_utils.PRECISIONS。
+    开启 MATRIX_NODES_FRAME_CACHE 时，文件路径按 (路径, mtime, size) 命中磁盘缓存的解码结果，跳过解码。
+    """
     try:
+        cache = get_frame_cache() if isinstance(file_path, str) else None
+        if cache is not None:
+            key = frame_key(file_path, os.stat(file_path))
+            arr = cache.get(key)
+            if arr is not None: return from_uint8_array(arr, precision)
         img = Image.open(file_path)
         img = img.convert("RGB")
         img = ImageOps.exif_transpose(img)
-        image = np.array(img).astype(np.float32) / 255.0
-        image = torch.from_numpy(image)[None,]
-        return image
+        arr = np.array(img)
+        if cache is not None:
+            # uint8 输出与 arr 共用内存 (零拷贝)，下游原地修改会写进尚未落盘的缓存，交给后台写入的必须是副本
+            cache.put(key, arr.copy() if precision == "uint8" else arr)
+        return from_uint8_array(arr, precision)
     except Exception as e:
         print(f"MatrixLoader Error: {e}")
         return None
@@ -72,98 +77,109 @@ def load_image_file(file_path):
 # 2. 通用基类
 # ========================================================
 
+def folder_wide_fingerprint(catalog, *extra, subfolders=True):
+    """
+    IS_CHANGED 的保守退路：某个决定读哪个文件的输入是连线 (ComfyUI 不传给 IS_CHANGED) 时，
+    对整个文件夹的文件取指纹，任何文件变化都会触发重算。
+    subfolders=True 表示输入可能引用子文件夹中的文件：有子文件夹时直接返回 NaN。
+    """
+    if subfolders and catalog.dir_names: return float("nan")
+    return asset_resolver.fingerprint(list(extra) + [asset_resolver.signature(catalog, n) for n in catalog.names])
+
+def folder_fingerprint(folder_path, resolve_slot, slot_keys, slot_count, kwargs, *extra):
+    """
+    IS_CHANGED 用：解析出的文件名 + mtime/size (来自共享目录缓存)。
+    引用的文件都没变时指纹不变，ComfyUI 会跳过加载和下游的重算。
+    slot_keys(i): 第 i 个槽位解析时需要的输入名；任何一个为 None (连线输入) 时退回整个文件夹的指纹。
+    """
+    if folder_path is None: return float("nan")
+    catalog = asset_resolver.get_catalog(folder_path)
+    if catalog is None: return f"missing:{folder_path}"
+    if any(kwargs.get(key) is None for i in range(1, slot_count + 1) for key in slot_keys(i)):
+        return folder_wide_fingerprint(catalog, *extra)
+    parts = list(extra)
+    for i in range(1, slot_count + 1):
+        name = resolve_slot(catalog, i)
+        parts.append("0" if name is False else asset_resolver.signature(catalog, name))
+    return asset_resolver.fingerprint(parts)
+
 class BaseMatrixLoaderIndex:
+    SLOT_COUNT = 5
+
+    @classmethod
+    def IS_CHANGED(s, folder_path=None, empty_style="White", **kwargs):
+        # 连线的输入在 IS_CHANGED 中为 None (值要到执行时才知道)，不能按默认值去猜
+        def resolve_slot(catalog, i):
+            prefix = kwargs[f"slot{i}_prefix"]
+            index = kwargs[f"slot{i}_index"]
+            if index == 0: return False
+            return asset_resolver.find_indexed_name(catalog, prefix, index)
+        return folder_fingerprint(folder_path, resolve_slot, lambda i: (f"slot{i}_prefix", f"slot{i}_index"), s.SLOT_COUNT, kwargs, empty_style)
+
+    @profiled
     def process_common(self, folder_path, empty_style, count, **kwargs):
+        precision = kwargs.get("output_precision", "fp32")
         images = []
         for i in range(1, count + 1):
             prefix = kwargs.get(f"slot{i}_prefix", "X")
             index = kwargs.get(f"slot{i}_index", 0)
             if index == 0:
-                images.append(create_placeholder(empty_style))
+                images.append(create_placeholder(empty_style, precision))
             else:
-                path = self.find_indexed_file(folder_path, prefix, index)
+                with phase("resolve"):
+                    path = self.find_indexed_file(folder_path, prefix, index)
                 if path:
-                    img = load_image_file(path)
-                    images.append(img if img is not None else create_error_image(f"{prefix}{index}"))
+                    with phase("decode"):
+                        img = load_image_file(path, precision)
+                    images.append(img if img is not None else create_error_image(f"{prefix}{index}", precision))
                 else:
-                    images.append(create_error_image(f"{prefix}{index}"))
+                    images.append(create_error_image(f"{prefix}{index}", precision))
         return tuple(images)
 
     def find_indexed_file(self, folder, prefix, index):
-        supported_exts = ["png", "jpg", "jpeg", "webp", "bmp"]
-        for ext in supported_exts:
-            path = os.path.join(folder, f"{prefix}{index}.{ext}")
-            if os.path.exists(path): return path
-        for ext in supported_exts:
-            path = os.path.join(folder, f"{prefix}{index:02d}.{ext}")
-            if os.path.exists(path): return path
-        return None
+        return asset_resolver.resolve_indexed(folder, prefix, index)
 
 class BaseMatrixLoaderDirect:
+    SLOT_COUNT = 5
+
+    @classmethod
+    def IS_CHANGED(s, folder_path=None, empty_style="White", **kwargs):
+        # img_txt_* 是 forceInput，通常都是连线，在 IS_CHANGED 中为 None：此时退回整个文件夹的指纹
+        def resolve_slot(catalog, i):
+            inp_str = str(kwargs[f"img_txt_{i}"]).strip()
+            if inp_str == "0" or inp_str == "" or inp_str.lower() == "none": return False
+            return asset_resolver.find_smart_name(catalog, inp_str)
+        return folder_fingerprint(folder_path, resolve_slot, lambda i: (f"img_txt_{i}",), s.SLOT_COUNT, kwargs, empty_style)
+
+    @profiled
     def process_common(self, folder_path, empty_style, count, **kwargs):
+        precision = kwargs.get("output_precision", "fp32")
         images = []
         for i in range(1, count + 1):
             inp = kwargs.get(f"img_txt_{i}", "0")
             inp_str = str(inp).strip()
             if inp_str == "0" or inp_str == "" or inp_str.lower() == "none":
-                images.append(create_placeholder(empty_style))
+                images.append(create_placeholder(empty_style, precision))
                 continue
-            path = self.find_file_smart(folder_path, inp_str)
+            with phase("resolve"):
+                path = self.find_file_smart(folder_path, inp_str)
             if path:
-                img = load_image_file(path)
-                images.append(img if img is not None else create_error_image(f"Error Loading:\n{inp_str}"))
+                with phase("decode"):
+                    img = load_image_file(path, precision)
+                images.append(img if img is not None else create_error_image(f"Error Loading:\n{inp_str}", precision))
             else:
-                images.append(create_error_image(inp_str))
+                images.append(create_error_image(inp_str, precision))
         return tuple(images)
 
     def parse_id(self, text):
-        match = re.match(r'^([a-zA-Z]+)(\d+)([a-zA-Z]?)$', text.strip())
-        if match:
-            prefix = match.group(1).lower()
-            number = int(match.group(2)) 
-            suffix = match.group(3).lower() 
-            return prefix, number, suffix
-        return None, None, None
+        return asset_resolver.parse_id(text)
 
     def parse_filename(self, filename):
-        match = re.match(r'^([a-zA-Z]+)(\d+)([a-zA-Z]?)(?:[.\-_ \u4e00-\u9fa5].*)?$', filename)
-        if match:
-            prefix = match.group(1).lower()
-            number = int(match.group(2))
-            suffix = match.group(3).lower()
-            return prefix, number, suffix
-        return None, None, None
+        return asset_resolver.parse_filename(filename)
 
     def find_file_smart(self, folder, input_str):
-        if not os.path.exists(folder): return None
-        input_str = input_str.strip()
-        inp_prefix, inp_num, inp_suffix = self.parse_id(input_str)
-        supported_exts = ["png", "jpg", "jpeg", "webp", "bmp"]
         try:
-            all_files = sorted(os.listdir(folder))
-            if inp_prefix is not None:
-                candidates = []
-                for filename in all_files:
-                    if not any(filename.lower().endswith(ext) for ext in supported_exts):
-                        continue
-                    name_stem = os.path.splitext(filename)[0]
-                    f_prefix, f_num, f_suffix = self.parse_filename(name_stem)
-                    if f_prefix is None: continue
-                    if (inp_prefix == f_prefix and inp_num == f_num and inp_suffix == f_suffix):
-                        candidates.append(filename)
-                if candidates:
-                    candidates.sort(key=len)
-                    return os.path.join(folder, candidates[0])
-            direct_path = os.path.join(folder, input_str)
-            if os.path.exists(direct_path) and os.path.isfile(direct_path): return direct_path
-            for ext in supported_exts:
-                test_path = os.path.join(folder, f"{input_str}.{ext}")
-                if os.path.exists(test_path): return test_path
-            if inp_prefix is None: 
-                for filename in all_files:
-                    if filename.startswith(input_str):
-                        if any(filename.lower().endswith(ext) for ext in supported_exts):
-                            return os.path.join(folder, filename)
+            return asset_resolver.resolve_smart(folder, input_str)
         except Exception as e:
             print(f"MatrixLoader Error: {e}")
         return None
@@ -187,6 +203,7 @@ class MatrixImageLoader_Index5(BaseMatrixLoaderIndex):
                 "slot3_prefix": ("STRING", {"default": "Z"}), "slot3_index": ("INT", {"default": 0, "min": 0, "max": 9999}),
                 "slot4_prefix": ("STRING", {"default": "A"}), "slot4_index": ("INT", {"default": 0, "min": 0, "max": 9999}),
                 "slot5_prefix": ("STRING", {"default": "B"}), "slot5_index": ("INT", {"default": 0, "min": 0, "max": 9999}),
+                "output_precision": (PRECISIONS, {"default": "fp32", "tooltip": "输出精度：fp32 标准 / fp16 半内存 / uint8 四分之一内存 (uint8 仅限 Matrix 节点：拼图、Qwen 编码、视频合成、数据集保存；其他节点按 0-1 浮点处理，会得到错误结果，请保持 fp32 / fp16)"}),
             }
         }
     RETURN_TYPES = ("IMAGE", "IMAGE", "IMAGE", "IMAGE", "IMAGE")
@@ -198,6 +215,7 @@ class MatrixImageLoader_Index5(BaseMatrixLoaderIndex):
 
 class MatrixImageLoader_Index10(BaseMatrixLoaderIndex):
     DESCRIPTION = "【🧩 矩阵-滑块加载器 (10图版)】"
+    SLOT_COUNT = 10
     @classmethod
     def INPUT_TYPES(s):
         return {
@@ -216,6 +234,7 @@ class MatrixImageLoader_Index10(BaseMatrixLoaderIndex):
                 "slot8_prefix": ("STRING", {"default": "E"}), "slot8_index": ("INT", {"default": 0, "min": 0, "max": 9999}),
                 "slot9_prefix": ("STRING", {"default": "F"}), "slot9_index": ("INT", {"default": 0, "min": 0, "max": 9999}),
                 "slot10_prefix": ("STRING", {"default": "G"}), "slot10_index": ("INT", {"default": 0, "min": 0, "max": 9999}),
+                "output_precision": (PRECISIONS, {"default": "fp32", "tooltip": "输出精度：fp32 标准 / fp16 半内存 / uint8 四分之一内存 (uint8 仅限 Matrix 节点：拼图、Qwen 编码、视频合成、数据集保存；其他节点按 0-1 浮点处理，会得到错误结果，请保持 fp32 / fp16)"}),
             }
         }
     RETURN_TYPES = ("IMAGE", "IMAGE", "IMAGE", "IMAGE", "IMAGE", "IMAGE", "IMAGE", "IMAGE", "IMAGE", "IMAGE")
@@ -244,6 +263,7 @@ class MatrixImageLoader_Direct5(BaseMatrixLoaderDirect):
                 "img_txt_3": ("STRING", {"default": "0", "multiline": False, "forceInput": True}),
                 "img_txt_4": ("STRING", {"default": "0", "multiline": False, "forceInput": True}),
                 "img_txt_5": ("STRING", {"default": "0", "multiline": False, "forceInput": True}),
+                "output_precision": (PRECISIONS, {"default": "fp32", "tooltip": "输出精度：fp32 标准 / fp16 半内存 / uint8 四分之一内存 (uint8 仅限 Matrix 节点：拼图、Qwen 编码、视频合成、数据集保存；其他节点按 0-1 浮点处理，会得到错误结果，请保持 fp32 / fp16)"}),
             }
         }
     RETURN_TYPES = ("IMAGE", "IMAGE", "IMAGE", "IMAGE", "IMAGE")
@@ -255,6 +275,7 @@ class MatrixImageLoader_Direct5(BaseMatrixLoaderDirect):
 
 class MatrixImageLoader_Direct10(BaseMatrixLoaderDirect):
     DESCRIPTION = "【🧩 矩阵-字符加载器 (10图版)】"
+    SLOT_COUNT = 10
     @classmethod
     def INPUT_TYPES(s):
         return {
@@ -273,6 +294,7 @@ class MatrixImageLoader_Direct10(BaseMatrixLoaderDirect):
                 "img_txt_8": ("STRING", {"default": "0", "multiline": False, "forceInput": True}),
                 "img_txt_9": ("STRING", {"default": "0", "multiline": False, "forceInput": True}),
                 "img_txt_10": ("STRING", {"default": "0", "multiline": False, "forceInput": True}),
+                "output_precision": (PRECISIONS, {"default": "fp32", "tooltip": "输出精度：fp32 标准 / fp16 半内存 / uint8 四分之一内存 (uint8 仅限 Matrix 节点：拼图、Qwen 编码、视频合成、数据集保存；其他节点按 0-1 浮点处理，会得到错误结果，请保持 fp32 / fp16)"}),
             }
         }
     RETURN_TYPES = ("IMAGE", "IMAGE", "IMAGE", "IMAGE", "IMAGE", "IMAGE", "IMAGE", "IMAGE", "IMAGE", "IMAGE")
@@ -301,6 +323,9 @@ class MatrixFolderIterator:
     2. 过滤功能: 只加载包含(或不包含)特定字符的图片 (例如只加载带 "LF" 的)。
     3. 自动循环: 内置取模逻辑。如果有 5 张图，输入 Index 6 会自动加载 Index 1。
     4. 统计输出: 输出符合条件的图片总数 (Count)，用于控制 Loop 的结束条件。
+    5. 数据集分片: 文件夹中的 .tar 分片 (Dataset Saver 的 Tar Shard 输出) 会被展开为 "分片.tar/成员名" 参与遍历。
+    6. Caption 输出: 读取同名 .txt、分片内的 .txt 或 JSONL 清单中的 caption。
+    7. 递归模式: 遍历所有子文件夹 (并行扫描)，文件名输出为相对路径 "子目录/文件名"，按相对路径全局排序，关键词过滤作用于整个相对路径。
     """
 
     @classmethod
@@ -313,66 +338,97 @@ class MatrixFolderIterator:
                 "filter_text": ("STRING", {"default": "", "multiline": False, "tooltip": "筛选关键词 (留空则匹配所有)"}),
                 "extension": (["All", "png", "jpg", "jpeg", "webp", "bmp"], {"default": "All", "tooltip": "只匹配特定后缀的文件"}),
                 "empty_style": (["White", "Black"], {"default": "White", "tooltip": "如果文件夹为空或找不到文件，输出的占位图颜色"}),
+            },
+            "optional": {
+                "output_precision": (PRECISIONS, {"default": "fp32", "tooltip": "输出精度：fp32 标准 / fp16 半内存 / uint8 四分之一内存 (uint8 仅限 Matrix 节点：拼图、Qwen 编码、视频合成、数据集保存；其他节点按 0-1 浮点处理，会得到错误结果，请保持 fp32 / fp16)"}),
+                "recursive": ("BOOLEAN", {"default": False, "tooltip": "包含所有子文件夹 (Count / Index 作用于整棵目录树)"}),
             }
         }
 
-    RETURN_TYPES = ("IMAGE", "STRING", "INT")
-    RETURN_NAMES = ("Image", "Filename", "Count")
+    RETURN_TYPES = ("IMAGE", "STRING", "INT", "STRING")
+    RETURN_NAMES = ("Image", "Filename", "Count", "Caption")
     FUNCTION = "load_image_by_index"
     CATEGORY = "Custom/Matrix"
 
-    def load_image_by_index(self, folder_path, image_index, filter_mode, filter_text, extension, empty_style):
-        if not os.path.exists(folder_path):
-            print(f"MatrixIterator Error: Path not found {folder_path}")
-            return (create_placeholder(empty_style), "None", 0)
-
-        # 1. 获取所有文件并过滤后缀
+    @classmethod
+    def IS_CHANGED(s, folder_path=None, image_index=None, filter_mode=None, filter_text=None, extension=None, empty_style="White", output_precision="fp32", recursive=False, **kwargs):
+        # 目标文件 + 数量 + caption 来源 (同名 .txt / 清单) 的 mtime/size
+        # 连线的输入在 IS_CHANGED 中为 None：image_index 接 Loop 时不知道读哪张，退回整个文件夹的指纹
+        if folder_path is None: return float("nan")
+        if None in (image_index, filter_mode, filter_text, extension):
+            if recursive: return float("nan")
+            catalog = asset_resolver.get_catalog(folder_path)
+            if catalog is None: return f"missing:{folder_path}"
+            return folder_wide_fingerprint(catalog, empty_style, subfolders=False)
+        catalog, files = asset_resolver.list_assets(folder_path, extension, filter_mode, filter_text, recursive)
+        if catalog is None or not files: return f"empty:{folder_path}:{empty_style}"
+        target = files[image_index % len(files)]
+        parts = [len(files), asset_resolver.signature(catalog, target)]
+        sub_catalog, name = asset_resolver.locate(catalog, target)
+        if sub_catalog is not None and not is_shard_member(name):
+            parts.append(asset_resolver.signature(sub_catalog, sub_catalog.find(os.path.splitext(name)[0] + ".txt")))
+            parts.extend(asset_resolver.signature(sub_catalog, f) for f in sub_catalog.names if f.endswith(MANIFEST_SUFFIX))
+        return asset_resolver.fingerprint(parts)
+
+    @profiled
+    def load_image_by_index(self, folder_path, image_index, filter_mode, filter_text, extension, empty_style, output_precision="fp32", recursive=False):
+        # 1. 从共享目录缓存获取过滤后的文件列表 (后缀 / 关键词 / tar 分片展开，已排序保证 Index 稳定)
         try:
-            files = os.listdir(folder_path)
+            with phase("scan"):
+                catalog, filtered_files = asset_resolver.list_assets(folder_path, extension, filter_mode, filter_text, recursive)
         except Exception as e:
             print(f"MatrixIterator Error reading dir: {e}")
-            return (create_placeholder(empty_style), "Error", 0)
-            
-        valid_exts = [".png", ".jpg", ".jpeg", ".webp", ".bmp"]
-        if extension != "All":
-            valid_exts = [f".{extension}"]
-
-        filtered_files = []
-        for f in files:
-            # 后缀检查
-            if not any(f.lower().endswith(ext) for ext in valid_exts):
-                continue
-            
-            # 关键词过滤
-            if filter_text:
-                if filter_mode == "Contains":
-                    if filter_text not in f: continue
-                else: # Not Contains
-                    if filter_text in f: continue
-            
-            filtered_files.append(f)
-
-        # 2. 排序 (保证 Index 对应关系稳定)
-        filtered_files.sort()
+            return (create_placeholder(empty_style, output_precision), "Error", 0, "")
+        if catalog is None:
+            print(f"MatrixIterator Error: Path not found {folder_path}")
+            return (create_placeholder(empty_style, output_precision), "None", 0, "")
         count = len(filtered_files)
 
         if count == 0:
             print("MatrixIterator: No matching files found.")
-            return (create_placeholder(empty_style), "None", 0)
+            return (create_placeholder(empty_style, output_precision), "None", 0, "")
 
-        # 3. 计算实际 Index (取模循环)
+        # 2. 计算实际 Index (取模循环)
         # 例如 count=5, index=0 -> 0; index=4 -> 4; index=5 -> 0
         actual_index = image_index % count
         
         target_filename = filtered_files[actual_index]
-        full_path = os.path.join(folder_path, target_filename)
 
-        # 4. 加载图片
-        image = load_image_file(full_path)
+        # 3. 加载图片
+        with phase("decode"):
+            if is_shard_member(target_filename):
+                tar_name, member = split_shard_member(target_filename)
+                data = read_tar_member(os.path.join(folder_path, tar_name), member)
+                image = load_image_file(io.BytesIO(data), output_precision) if data is not None else None
+            else:
+                image = load_image_file(os.path.join(folder_path, target_filename), output_precision)
         if image is None:
-             image = create_error_image(target_filename)
+             image = create_error_image(target_filename, output_precision)
+
+        caption = self.read_caption(catalog, target_filename)
+        return (image, target_filename, count, caption)
 
-        return (image, target_filename, count)
+    def read_caption(self, catalog, target_filename):
+        try:
+            # 递归模式下 target_filename 是相对路径，caption 在它所在的子目录里找
+            catalog, target_filename = asset_resolver.locate(catalog, target_filename)
+            if catalog is None: return ""
+            stem = os.path.splitext(target_filename)[0]
+            if is_shard_member(target_filename):
+                tar_name, member = split_shard_member(stem)
+                data = read_tar_member(catalog.path(tar_name), f"{member}.txt")
+                return data.decode("utf-8") if data is not None else ""
+            txt_name = catalog.find(f"{stem}.txt")
+            if txt_name is not None and catalog.is_file(txt_name):
+                with open(catalog.path(txt_name), "r", encoding="utf-8") as f:
+                    return f.read()
+            for f in catalog.names:
+                if f.endswith(MANIFEST_SUFFIX):
+                    caption = read_manifest(catalog.path(f)).get(target_filename)
+                    if caption is not None: return caption
+        except Exception as e:
+            print(f"MatrixIterator Error reading caption: {e}")
+        return ""
 
 # ========================================================
 # 6. 其他节点
@@ -583,20 +639,9 @@ NODE_DISPLAY_NAME_MAPPINGS = {
     "MatrixStringChopper": "🧩 Matrix String Slicer | 矩阵-切割刀",
 }
 
-if HAS_QWEN:
-    NODE_CLASS_MAPPINGS.update(Qwen_Mappings)
-    Qwen_Display_Mappings["MatrixTextEncodeQwen5"] = "🧩 Matrix Qwen Encode (5) | Qwen-VL编码"
-    Qwen_Display_Mappings["MatrixTextEncodeQwen10"] = "🧩 Matrix Qwen Encode (10 Experimental) | Qwen-VL编码"
-    NODE_DISPLAY_NAME_MAPPINGS.update(Qwen_Display_Mappings)
-
-if HAS_GRID:
-    NODE_CLASS_MAPPINGS.update(Grid_Mappings)
-    NODE_DISPLAY_NAME_MAPPINGS.update(Grid_Display_Mappings)
-
-if HAS_VIDEO:
-    NODE_CLASS_MAPPINGS.update(Video_Mappings)
-    NODE_DISPLAY_NAME_MAPPINGS.update(Video_Display_Mappings)
-
-if HAS_DATASET:
-    NODE_CLASS_MAPPINGS.update(Dataset_Mappings)
-    NODE_DISPLAY_NAME_MAPPINGS.update(Dataset_Display_Mappings)
\ No newline at end of file
+Sub_Mappings, Sub_Display_Mappings = load_submodule_mappings()
+if "MatrixTextEncodeQwen5" in Sub_Mappings:
+    Sub_Display_Mappings["MatrixTextEncodeQwen5"] = "🧩 Matrix Qwen Encode (5) | Qwen-VL编码"
+    Sub_Display_Mappings["MatrixTextEncodeQwen10"] = "🧩 Matrix Qwen Encode (10 Experimental) | Qwen-VL编码"
+NODE_CLASS_MAPPINGS.update(Sub_Mappings)
+NODE_DISPLAY_NAME_MAPPINGS.update(Sub_Display_Mappings)
@@ -0,0 +1,400 @@
+# -*- coding: utf-8 -*-
+"""
+统一的素材解析：Index / Direct 加载器、文件夹遍历器、联系表共用一份文件夹目录 (FolderCatalog)。
+- 每个文件夹在进程内只扫描一次，之后靠目录 mtime 判断是否需要重扫 (增删改名都会改变目录 mtime)
+- 开启 folder_watch 后改由文件系统事件标记失效，热文件夹上的查找没有任何系统调用
+- 递归列表由每个子目录各自的 catalog 拼成：并行 scandir，只重扫发生变化的子目录
+- 文件名按 normcase 建索引 (Windows 下大小写不敏感，与 os.path.exists 的行为一致)
+- "前缀+数字+后缀" 形式的 ID 预先解析好，智能查找不再逐个正则匹配
+"""
+import hashlib
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from .matrix_profiler import count as profile_count
+from .dataset_shards import list_tar_members
+from . import folder_watch
+
+IMAGE_EXTS = ("png", "jpg", "jpeg", "webp", "bmp")
+_DOT_EXTS = tuple(f".{ext}" for ext in IMAGE_EXTS)
+
+# 递归模式下每个子目录一个 catalog，上限按"数千子目录的数据集"留足
+MAX_CATALOGS = 65536
+SCAN_WORKERS = min(32, (os.cpu_count() or 4) * 2)
+# 目录 mtime 精度有限 (FAT 2 秒，部分文件系统 1 秒)：扫描时刻离 mtime 太近的目录，下次仍然重扫
+MTIME_SLACK_NS = 2_000_000_000
+
+_ID_RE = re.compile(r'^([a-zA-Z]+)(\d+)([a-zA-Z]?)$')
+_FILENAME_RE = re.compile(r'^([a-zA-Z]+)(\d+)([a-zA-Z]?)(?:[.\-_ \u4e00-\u9fa5].*)?$')
+
+def parse_id(text):
+    """ "X1" / "x01b" -> ("x", 1, "b")；不是 ID 返回 (None, None, None)。"""
+    match = _ID_RE.match(text.strip())
+    if match:
+        return match.group(1).lower(), int(match.group(2)), match.group(3).lower()
+    return None, None, None
+
+def parse_filename(stem):
+    """ "X01-远景" / "X1b_final" -> ("x", 1, "")/("x", 1, "b")。"""
+    match = _FILENAME_RE.match(stem)
+    if match:
+        return match.group(1).lower(), int(match.group(2)), match.group(3).lower()
+    return None, None, None
+
+def is_image_name(name):
+    return name.lower().endswith(_DOT_EXTS)
+
+# ========================================================
+# 文件夹目录
+# ========================================================
+
+class FolderCatalog:
+    def __init__(self, folder):
+        self.folder = folder
+        self.lock = threading.Lock()
+        self.mtime_ns = None
+        self.stable = False
+        self.generation = 0
+        self.watched = False   # 由 folder_watch 维护 dirty 标记
+        self.watch_handle = None
+        self.dirty = True
+        self.names = []        # 全部条目，已排序
+        self._lookup = None    # normcase(名字) -> 名字，按需构建 (递归列表用不到)
+        self.file_names = set()
+        self.dir_names = []    # 子目录 (不跟随符号链接，避免环)
+        self._ids = None       # (前缀, 数字, 后缀) -> [图片文件名]，按需构建
+        self._listings = {}    # 遍历器过滤结果缓存
+        self._stats = {}       # 名字 -> (mtime_ns, size)，仅被监视时缓存
+
+    def scan(self, mtime_ns):
+        names, file_names, dir_names = [], set(), []
+        with os.scandir(self.folder) as it:
+            for entry in it:
+                names.append(entry.name)
+                try:
+                    # Linux / Windows 下 DirEntry 自带类型信息，一般不需要额外 stat
+                    if entry.is_file(): file_names.add(entry.name)
+                    elif entry.is_dir(follow_symlinks=False): dir_names.append(entry.name)
+                except OSError:
+                    pass
+        names.sort()
+        dir_names.sort()
+        profile_count("files_scanned", len(names))
+        self.names = names
+        self.file_names = file_names
+        self.dir_names = dir_names
+        self._lookup = None
+        self._ids = None
+        self._listings = {}
+        self._stats = {}
+        self.mtime_ns = mtime_ns
+        self.stable = time.time_ns() - mtime_ns > MTIME_SLACK_NS
+        self.generation += 1
+
+    def is_fresh(self):
+        """被监视且没有未处理的事件：不需要任何系统调用即可使用。"""
+        return self.watched and not self.dirty
+
+    def refresh(self):
+        """
+        被监视的目录：没有事件就直接命中 (零系统调用)；
+        未监视的目录：目录 mtime 变化 (或上次扫描时 mtime 尚不可信) 时重扫。
+        返回 False 表示文件夹不可用。
+        """
+        if self.is_fresh():
+            profile_count("catalog_hits")
+            return True
+        try:
+            mtime_ns = os.stat(self.folder).st_mtime_ns
+        except OSError:
+            return False
+        with self.lock:
+            if self.watched:
+                # 先清标记再扫描：扫描期间到达的事件会重新标记，下次再扫
+                self.dirty = False
+            elif self.mtime_ns == mtime_ns and self.stable:
+                profile_count("catalog_hits")
+                return True
+            profile_count("catalog_misses")
+            self.scan(mtime_ns)
+        return True
+
+    def find(self, name):
+        """按文件名查找 (Windows 下大小写不敏感)，返回实际文件名或 None。"""
+        lookup = self._lookup
+        if lookup is None:
+            lookup = self._lookup = {os.path.normcase(n): n for n in self.names}
+        return lookup.get(os.path.normcase(name))
+
+    def is_file(self, name):
+        return name in self.file_names
+
+    def path(self, name):
+        return os.path.join(self.folder, name)
+
+    def file_stat(self, name):
+        """
+        (mtime_ns, size)，文件不存在返回 None。
+        原地改写文件不会改变目录 mtime，所以只有被监视 (写完 / touch 都有事件) 时才缓存，否则直接 stat。
+        """
+        cacheable = self.watched and not self.dirty
+        if cacheable and name in self._stats:
+            return self._stats[name]
+        try:
+            st = os.stat(self.path(name))
+            value = (st.st_mtime_ns, st.st_size)
+        except OSError:
+            value = None
+        if cacheable: self._stats[name] = value
+        return value
+
+    def id_index(self):
+        ids = self._ids
+        if ids is None:
+            ids, generation = {}, self.generation
+            for name in self.names:
+                if not is_image_name(name): continue
+                key = parse_filename(os.path.splitext(name)[0])
+                if key[0] is None: continue
+                ids.setdefault(key, []).append(name)
+            # 只在目录没有被重扫时写入，避免用旧列表覆盖新的缓存
+            with self.lock:
+                if self.generation == generation: self._ids = ids
+        return ids
+
+    def listing(self, extension="All", filter_mode="Contains", filter_text=""):
+        """遍历器使用的过滤列表 (tar 分片展开为 "分片.tar/成员名")，同一目录版本内只计算一次。"""
+        key = (extension, filter_mode, filter_text)
+        cached = self._listings.get(key)
+        if cached is not None: return cached
+        generation = self.generation
+
+        valid_exts = _DOT_EXTS if extension == "All" else (f".{extension}",)
+        candidates = []
+        for name in self.names:
+            if name.lower().endswith(".tar"):
+                try:
+                    candidates.extend(f"{name}/{m}" for m in list_tar_members(self.path(name)))
+                except Exception as e:
+                    print(f"MatrixIterator Error reading shard {name}: {e}")
+            else:
+                candidates.append(name)
+
+        result = []
+        for name in candidates:
+            if not name.lower().endswith(valid_exts): continue
+            if filter_text:
+                if filter_mode == "Contains":
+                    if filter_text not in name: continue
+                else:
+                    if filter_text in name: continue
+            result.append(name)
+        result.sort()
+        with self.lock:
+            if self.generation == generation: self._listings[key] = result
+        return result
+
+_CATALOGS = OrderedDict()
+_CATALOGS_LOCK = threading.Lock()
+
+def _catalog_entry(folder):
+    """取 (或创建并挂上监视) 文件夹对应的 FolderCatalog，不刷新。"""
+    # 绝对路径只做字符串规整，不调用 getcwd
+    key = os.path.normcase(os.path.normpath(folder) if os.path.isabs(folder) else os.path.abspath(folder))
+    evicted = []
+    with _CATALOGS_LOCK:
+        catalog = _CATALOGS.get(key)
+        if catalog is None:
+            catalog = _CATALOGS[key] = FolderCatalog(folder)
+            while len(_CATALOGS) > MAX_CATALOGS:
+                evicted.append(_CATALOGS.popitem(last=False)[1])
+            watcher = folder_watch.get_watcher()
+            if watcher is not None:
+                # 先挂监视再做第一次扫描，扫描期间的变化不会丢
+                for old in evicted: watcher.unwatch(old)
+                catalog.watched = watcher.watch(catalog)
+        else:
+            _CATALOGS.move_to_end(key)
+    return catalog
+
+def _refresh(catalog):
+    try:
+        return catalog.refresh()
+    except OSError as e:
+        print(f"MatrixLoader Error: {e}")
+        return False
+
+def get_catalog(folder):
+    """返回最新的 FolderCatalog；文件夹不存在或不可读时返回 None。"""
+    if not folder: return None
+    catalog = _catalog_entry(folder)
+    return catalog if _refresh(catalog) else None
+
+def clear_catalogs():
+    """丢弃所有目录缓存 (基准测试冷启动用)。"""
+    watcher = folder_watch.get_watcher()
+    with _CATALOGS_LOCK:
+        catalogs = list(_CATALOGS.values())
+        _CATALOGS.clear()
+        _TREES.clear()
+    if watcher is not None:
+        for catalog in catalogs: watcher.unwatch(catalog)
+
+# ========================================================
+# 递归遍历
+# ========================================================
+
+_SCAN_POOL = None
+# (根目录, 过滤条件) -> (各子目录 catalog 的版本签名, 合并后的列表)
+_TREES = {}
+
+def _scan_pool():
+    global _SCAN_POOL
+    if _SCAN_POOL is None:
+        with _CATALOGS_LOCK:
+            if _SCAN_POOL is None:
+                _SCAN_POOL = ThreadPoolExecutor(max_workers=SCAN_WORKERS, thread_name_prefix="MatrixScan")
+    return _SCAN_POOL
+
+def walk_catalogs(root):
+    """
+    广度优先刷新 root 下所有子目录的 catalog，返回 [(相对目录前缀 "a/b/", catalog)]，根目录前缀为 ""。
+    每一层中需要重扫的目录并行 scandir (释放 GIL)；被监视且无事件的目录直接使用，不产生系统调用。
+    """
+    walked = []
+    frontier = [("", root)]
+    while frontier:
+        catalogs = [_catalog_entry(path) for _, path in frontier]
+        stale = [c for c in catalogs if not c.is_fresh()]
+        if len(stale) > 1:
+            ok = dict(zip(map(id, stale), _scan_pool().map(_refresh, stale)))
+        else:
+            ok = {id(c): _refresh(c) for c in stale}
+        next_frontier = []
+        for (rel, path), catalog in zip(frontier, catalogs):
+            if not ok.get(id(catalog), True): continue
+            walked.append((rel, catalog))
+            next_frontier.extend((f"{rel}{d}/", os.path.join(path, d)) for d in catalog.dir_names)
+        frontier = next_frontier
+    return walked
+
+def list_tree(root, extension="All", filter_mode="Contains", filter_text=""):
+    """
+    递归列表：相对路径 ("a/b/x.png"，分隔符统一为 "/")，全局按相对路径排序，结果与扫描顺序 / 线程数无关。
+    关键词过滤作用于整个相对路径 (可按子目录名筛选)。所有子目录都没变化时直接复用上次的合并结果。
+    """
+    walked = walk_catalogs(root)
+    if not walked: return None, []
+    root_catalog = walked[0][1]
+    key = (os.path.normcase(root_catalog.folder), extension, filter_mode, filter_text)
+    signature = tuple((id(c), c.generation) for _, c in walked)
+    hit = _TREES.get(key)
+    if hit is not None and hit[0] == signature:
+        profile_count("tree_hits")
+        return root_catalog, hit[1]
+
+    result = []
+    for rel, catalog in walked:
+        names = catalog.listing(extension)
+        if filter_text:
+            if filter_mode == "Contains":
+                result.extend(rel + n for n in names if filter_text in rel + n)
+            else:
+                result.extend(rel + n for n in names if filter_text not in rel + n)
+        else:
+            result.extend(rel + n for n in names)
+    result.sort()
+    if len(_TREES) >= 64: _TREES.clear()
+    _TREES[key] = (signature, result)
+    return root_catalog, result
+
+def locate(catalog, name):
+    """递归列表中的相对名字 -> (所在子目录的 catalog, 目录内的名字)；子目录已不存在时 catalog 为 None。"""
+    head = name.split(".tar/", 1)[0]
+    dirpart = head.rpartition("/")[0]
+    if not dirpart: return catalog, name
+    return get_catalog(os.path.join(catalog.folder, *dirpart.split("/"))), name[len(dirpart) + 1:]
+
+# ========================================================
+# 查询
+# ========================================================
+
+def find_indexed_name(catalog, prefix, index):
+    """ "X" + 1 -> X1.png / X1.jpg ... 其次 X01.png ...；按扩展名顺序取第一个存在的。"""
+    for pattern in (f"{prefix}{index}", f"{prefix}{index:02d}"):
+        for ext in IMAGE_EXTS:
+            name = catalog.find(f"{pattern}.{ext}")
+            if name is not None: return name
+    return None
+
+def find_smart_name(catalog, input_str):
+    """
+    Direct 加载器的查找规则，返回相对文件夹的名字：
+    1. 输入是 ID ("X1b")：匹配前缀/数字/后缀都相同的图片，多个候选取文件名最短的
+    2. 输入是文件名：直接存在即返回，否则尝试补全扩展名
+    3. 输入不是 ID：取第一个以输入开头的图片 (模糊前缀)
+    """
+    input_str = input_str.strip()
+    inp_prefix, inp_num, inp_suffix = parse_id(input_str)
+
+    if inp_prefix is not None:
+        candidates = catalog.id_index().get((inp_prefix, inp_num, inp_suffix))
+        if candidates:
+            return min(candidates, key=len)
+
+    name = catalog.find(input_str)
+    if name is not None and catalog.is_file(name):
+        return name
+    if os.path.dirname(input_str):
+        # 带子目录的相对路径不在目录缓存里，直接检查
+        if os.path.isfile(catalog.path(input_str)): return input_str
+
+    for ext in IMAGE_EXTS:
+        name = catalog.find(f"{input_str}.{ext}")
+        if name is not None: return name
+        if os.path.dirname(input_str) and os.path.isfile(catalog.path(f"{input_str}.{ext}")):
+            return f"{input_str}.{ext}"
+
+    if inp_prefix is None:
+        for name in catalog.names:
+            if name.startswith(input_str) and is_image_name(name):
+                return name
+    return None
+
+def resolve_indexed(folder, prefix, index):
+    catalog = get_catalog(folder)
+    if catalog is None: return None
+    name = find_indexed_name(catalog, prefix, index)
+    return catalog.path(name) if name is not None else None
+
+def resolve_smart(folder, input_str):
+    catalog = get_catalog(folder)
+    if catalog is None: return None
+    name = find_smart_name(catalog, input_str)
+    return catalog.path(name) if name is not None else None
+
+def list_assets(folder, extension="All", filter_mode="Contains", filter_text="", recursive=False):
+    """返回 (catalog, 过滤后的文件名列表)；文件夹不可用时返回 (None, [])。recursive 见 list_tree。"""
+    if recursive: return list_tree(folder, extension, filter_mode, filter_text)
+    catalog = get_catalog(folder)
+    if catalog is None: return None, []
+    return catalog, catalog.listing(extension, filter_mode, filter_text)
+
+# ========================================================
+# IS_CHANGED 指纹
+# ========================================================
+
+def signature(catalog, name):
+    """ "名字:mtime:size"；tar 分片成员取分片文件本身的状态。"""
+    if name is None: return "-"
+    catalog, name = locate(catalog, name)
+    if catalog is None: return f"{name}:missing"
+    stat_name = name.split(".tar/", 1)[0] + ".tar" if ".tar/" in name else name
+    st = catalog.file_stat(stat_name)
+    return f"{name}:{st[0]}:{st[1]}" if st is not None else f"{name}:missing"
+
+def fingerprint(parts):
+    return hashlib.sha256("\n".join(str(p) for p in parts).encode("utf-8")).hexdigest()
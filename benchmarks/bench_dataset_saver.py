@@ -0,0 +1,56 @@
+"""
+MatrixDatasetSaver 吞吐基准
+对比 Sync (逐张编码写盘) 与 Async (后台线程池 + flush 屏障) 的整批吞吐 (images/sec)。
+另测增量导出 (incremental=True)：首次全量导出、原样重跑、只改几条 caption 后重跑。
+
+    python benchmarks/bench_dataset_saver.py --comfyui /path/to/ComfyUI
+"""
+import shutil
+import tempfile
+import time
+
+from common import base_parser, setup, load_module, best_time
+
+def main():
+    parser = base_parser(__doc__)
+    parser.add_argument("--batch", type=int, default=32)
+    parser.add_argument("--size", type=int, default=1024)
+    parser.add_argument("--format", default="png", choices=["png", "jpg", "webp"])
+    args = parser.parse_args()
+    setup(args)
+
+    import torch
+    ds = load_module("matrix_dataset")
+    torch.manual_seed(0)
+    images = torch.rand((args.batch, args.size, args.size, 3), dtype=torch.float32)
+
+    out_dir = tempfile.mkdtemp(prefix="matrix_bench_")
+    try:
+        node = ds.MatrixDatasetSaver()
+        node.output_dir = out_dir
+
+        def run(mode):
+            node.save_dataset(images, "a photo of X1", "bench/img", args.format, 95, save_mode=mode, wait_for_pending=True)
+
+        results = {}
+        for mode in ("Sync", "Async"):
+            results[mode] = best_time(lambda: run(mode), args.repeat)
+            print(f"{mode:<5} {args.batch / results[mode]:8.2f} images/s  ({args.batch}x {args.size}px {args.format})")
+        print(f"speedup x{results['Sync'] / results['Async']:.2f}")
+
+        captions = [f"a photo of X{i}" for i in range(args.batch)]
+        def export(caps):
+            t0 = time.perf_counter()
+            node.save_dataset(images, "\n".join(caps), "bench_inc/img", args.format, 95, caption_mode="Per Line", incremental=True)
+            return time.perf_counter() - t0
+        edited = list(captions)
+        for i in range(0, args.batch, max(1, args.batch // 4)): edited[i] += ", edited"
+        full = export(captions)
+        print(f"incremental full export    {full:7.3f}s")
+        print(f"incremental rerun          {export(captions):7.3f}s")
+        print(f"incremental {args.batch - sum(a == b for a, b in zip(captions, edited))} captions edited {export(edited):7.3f}s")
+    finally:
+        shutil.rmtree(out_dir, ignore_errors=True)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,63 @@
+"""
+持久化解码帧缓存基准：模拟 worker 重启。
+每次在新的子进程中用 load_image_file 加载同一批 PNG 参考图 (默认 10 张 4K)：
+- no cache:   不开启缓存 (每次都解码)
+- first run:  开启缓存的首次运行 (解码 + 后台写缓存)
+- restart:    再次启动新进程，命中磁盘缓存 (mmap 读入，无解码)
+
+    python benchmarks/bench_frame_cache.py --width 3840 --height 2160
+"""
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+
+from common import base_parser, setup, load_package
+from bench_loader_memory import make_references
+
+def child(args):
+    import time
+    pkg = load_package()
+    paths = [os.path.join(args.folder, f"X{i}.png") for i in range(1, 11)]
+    t0 = time.perf_counter()
+    for p in paths: pkg.load_image_file(p)
+    elapsed = time.perf_counter() - t0
+    cache = pkg.get_frame_cache()
+    if cache is not None: cache.flush()
+    print(json.dumps({"seconds": elapsed}))
+
+def main():
+    parser = base_parser(__doc__)
+    parser.add_argument("--width", type=int, default=3840)
+    parser.add_argument("--height", type=int, default=2160)
+    parser.add_argument("--folder", default="")
+    parser.add_argument("--child", action="store_true")
+    args = parser.parse_args()
+    setup(args)
+    if args.child: return child(args)
+
+    folder = args.folder or os.path.join(tempfile.gettempdir(), f"matrix_refs_{args.width}x{args.height}")
+    make_references(folder, args.width, args.height)
+    cache_dir = tempfile.mkdtemp(prefix="matrix_frame_cache_")
+    cmd = [sys.executable, os.path.abspath(__file__), "--child", "--folder", folder]
+    if args.comfyui: cmd += ["--comfyui", args.comfyui]
+
+    def run(cache):
+        env = dict(os.environ)
+        env.pop("MATRIX_NODES_FRAME_CACHE", None)
+        if cache: env["MATRIX_NODES_FRAME_CACHE"] = cache_dir
+        out = subprocess.check_output(cmd, env=env)
+        return json.loads(out.decode().strip().splitlines()[-1])["seconds"]
+
+    try:
+        results = [("no cache", run(False)), ("first run", run(True)), ("restart", run(True))]
+    finally:
+        shutil.rmtree(cache_dir, ignore_errors=True)
+    print(f"10 x {args.width}x{args.height} PNG, fp32 output")
+    for label, seconds in results:
+        print(f"{label:>10}: {seconds:7.3f}s  ({10 / seconds:6.1f} images/s)")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+"""
+Qwen 参考 Latent 离线库基准 (FakeVAE，可用 --encode-ms 模拟真实 VAE 的编码耗时)
+- no store:    每次 encode 都对 5 张参考图做 VAE 编码 (目标图编码两次)
+- cold store:  首次运行，未命中后编码并写入库
+- warm store:  再次运行，全部从库中读取
+同时检查：库中读出的 latent 与直接编码结果一致，热库运行时 vae.encode 调用次数为 0。
+
+    python benchmarks/bench_latent_store.py --size 1024 --encode-ms 150
+"""
+import shutil
+import tempfile
+import time
+
+from common import base_parser, setup, load_module
+import synthetic
+
+def main():
+    parser = base_parser(__doc__)
+    parser.add_argument("--size", type=int, default=1024)
+    parser.add_argument("--encode-ms", type=float, default=0.0, help="每次 vae.encode 额外等待的毫秒数")
+    args = parser.parse_args()
+    setup(args)
+
+    import torch
+    from fakes import FakeCLIP, FakeVAE
+    qwen = load_module("qwen_encode")
+
+    class SlowVAE(FakeVAE):
+        def encode(self, pixels):
+            if args.encode_ms: time.sleep(args.encode_ms / 1000)
+            return super().encode(pixels)
+
+    node = qwen.MatrixTextEncodeQwen5()
+    images = {f"image{i}": synthetic.make_batch(1, args.size, args.size, seed=i) for i in range(1, 6)}
+    clip, vae = FakeCLIP(), SlowVAE()
+    store_dir = tempfile.mkdtemp(prefix="matrix_latent_store_")
+
+    def run(store):
+        vae.encode_calls = 0
+        t0 = time.perf_counter()
+        out = node.encode(clip, "make it blue", "", False, "image1", vae=vae, latent_store=store, **images)
+        return time.perf_counter() - t0, vae.encode_calls, out
+
+    try:
+        base_t, base_calls, base_out = run("")
+        cold_t, cold_calls, _ = run(store_dir)
+        warm_t, warm_calls, warm_out = run(store_dir)
+        for label, seconds, calls in (("no store", base_t, base_calls), ("cold store", cold_t, cold_calls), ("warm store", warm_t, warm_calls)):
+            print(f"{label:>10}: {seconds * 1000:8.1f} ms  vae.encode x{calls}")
+
+        base_refs = base_out[0][0][1]["reference_latents"]
+        warm_refs = warm_out[0][0][1]["reference_latents"]
+        same = all(torch.equal(a, b) for a, b in zip(base_refs, warm_refs))
+        same = same and torch.equal(base_out[2]["samples"], warm_out[2]["samples"])
+        print(f"latents identical: {same}; warm store encode calls: {warm_calls}")
+        if not same or warm_calls != 0: raise SystemExit(1)
+    finally:
+        shutil.rmtree(store_dir, ignore_errors=True)
+
+if __name__ == "__main__":
+    main()
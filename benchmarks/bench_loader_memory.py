@@ -0,0 +1,80 @@
+"""
+10 槽加载器的内存基准：fp32 / fp16 / uint8 三种 output_precision。
+对 Direct10 / Index10 各加载 10 张参考图 (默认 4K)，报告输出张量总字节、加载耗时、
+进程峰值 RSS (每种精度在独立子进程中测量)，以及下游 Asset Grid 10 消费这些输出的耗时。
+
+    python benchmarks/bench_loader_memory.py --width 3840 --height 2160
+"""
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+from common import base_parser, setup, load_package, load_module
+
+PRECISIONS = ["fp32", "fp16", "uint8"]
+
+def make_references(folder, width, height):
+    import numpy as np
+    from PIL import Image
+    os.makedirs(folder, exist_ok=True)
+    yy, xx = np.mgrid[0:height, 0:width]
+    for i in range(1, 11):
+        path = os.path.join(folder, f"X{i}.png")
+        if os.path.exists(path): continue
+        arr = np.stack([(xx * (i + 1)) % 256, (yy * (i + 2)) % 256, (xx + yy + i * 20) % 256], axis=-1).astype(np.uint8)
+        # compress_level=1：只为快速生成，解码耗时与正式素材同量级
+        Image.fromarray(arr).save(path, compress_level=1)
+
+def peak_rss_mb():
+    import resource
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss / (1024 * 1024) if sys.platform == "darwin" else rss / 1024
+
+def child(args):
+    pkg = load_package()
+    node = pkg.MatrixImageLoader_Direct10() if args.node == "direct" else pkg.MatrixImageLoader_Index10()
+    if args.node == "direct":
+        kwargs = {f"img_txt_{i}": f"X{i}" for i in range(1, 11)}
+    else:
+        kwargs = {**{f"slot{i}_prefix": "X" for i in range(1, 11)}, **{f"slot{i}_index": i for i in range(1, 11)}}
+    base_rss = peak_rss_mb()
+    t0 = time.perf_counter()
+    images = node.process(args.folder, "White", output_precision=args.precision, **kwargs)
+    t_load = time.perf_counter() - t0
+    n_bytes = sum(t.numel() * t.element_size() for t in images)
+    grid = load_module("matrix_grid").MatrixAssetGrid10()
+    t0 = time.perf_counter()
+    grid.create_grid(256, 5, True, **{f"img_{i}": images[i - 1] for i in range(1, 11)})
+    t_grid = time.perf_counter() - t0
+    print(json.dumps({"bytes": n_bytes, "load_s": t_load, "grid_s": t_grid, "peak_rss_mb": peak_rss_mb(), "base_rss_mb": base_rss, "dtype": str(images[0].dtype)}))
+
+def main():
+    parser = base_parser(__doc__)
+    parser.add_argument("--width", type=int, default=3840)
+    parser.add_argument("--height", type=int, default=2160)
+    parser.add_argument("--folder", default="", help="参考图文件夹 (默认在临时目录生成 X1..X10.png)")
+    parser.add_argument("--node", default="", choices=["", "direct", "index"])
+    parser.add_argument("--precision", default="", choices=[""] + PRECISIONS)
+    args = parser.parse_args()
+    setup(args)
+    if args.node and args.precision:
+        return child(args)
+
+    folder = args.folder or os.path.join(tempfile.gettempdir(), f"matrix_refs_{args.width}x{args.height}")
+    make_references(folder, args.width, args.height)
+    base_cmd = [sys.executable, os.path.abspath(__file__), "--folder", folder]
+    if args.comfyui: base_cmd += ["--comfyui", args.comfyui]
+    if args.no_stubs: base_cmd += ["--no-stubs"]
+    print(f"10 x {args.width}x{args.height} PNG references in {folder}")
+    for node in ("direct", "index"):
+        for precision in PRECISIONS:
+            out = subprocess.check_output(base_cmd + ["--node", node, "--precision", precision])
+            r = json.loads(out.decode().strip().splitlines()[-1])
+            print(f"{node:>6} {precision:>5}  outputs {r['bytes'] / 2**20:8.1f} MiB | peak RSS {r['peak_rss_mb']:8.1f} MiB "
+                  f"(+{r['peak_rss_mb'] - r['base_rss_mb']:7.1f}) | load {r['load_s']:6.2f}s | grid {r['grid_s']:6.2f}s")
+
+if __name__ == "__main__":
+    main()
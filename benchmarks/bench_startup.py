@@ -0,0 +1,54 @@
+"""
+包导入耗时基准 (模拟 ComfyUI 启动时加载 custom_nodes)
+每次在全新的子进程中先导入 torch / numpy / PIL (ComfyUI 启动时已加载)，再计时导入本包，
+并列出导入后哪些重依赖已经被加载；随后计时补导这些依赖，即延迟导入节省下来的启动时间。
+对比旧版本：git stash / checkout 到旧提交后再运行一次。
+
+    python benchmarks/bench_startup.py --repeat 9
+"""
+import json
+import statistics
+import subprocess
+import sys
+
+from common import base_parser, BENCH_DIR
+
+DEFERRED = ["soundfile", "comfy.utils", "node_helpers"]
+
+CHILD = r"""
+import importlib, json, sys, time
+sys.path.insert(0, {bench_dir!r})
+import torch, numpy, PIL.Image
+from common import setup, load_package
+setup(type("Args", (), {{"comfyui": {comfyui!r}, "no_stubs": {no_stubs!r}}})())
+deferred = {deferred!r}
+t0 = time.perf_counter()
+pkg = load_package()
+t_pkg = time.perf_counter() - t0
+loaded = [m for m in deferred if m in sys.modules]
+t0 = time.perf_counter()
+for m in deferred:
+    try: importlib.import_module(m)
+    except ImportError: pass
+t_deferred = time.perf_counter() - t0
+print(json.dumps({{"package": t_pkg, "deferred": t_deferred, "loaded_at_import": loaded, "nodes": len(pkg.NODE_CLASS_MAPPINGS)}}))
+"""
+
+def run_once(args):
+    code = CHILD.format(bench_dir=BENCH_DIR, comfyui=args.comfyui, no_stubs=args.no_stubs, deferred=DEFERRED)
+    out = subprocess.check_output([sys.executable, "-c", code], cwd=BENCH_DIR)
+    return json.loads(out.decode().strip().splitlines()[-1])
+
+def main():
+    parser = base_parser(__doc__)
+    args = parser.parse_args()
+    runs = [run_once(args) for _ in range(max(1, args.repeat))]
+    t_pkg = statistics.median(r["package"] for r in runs) * 1000
+    t_def = statistics.median(r["deferred"] for r in runs) * 1000
+    print(f"nodes registered:        {runs[-1]['nodes']}")
+    print(f"package import (median): {t_pkg:8.1f} ms")
+    print(f"deferred deps  (median): {t_def:8.1f} ms  (paid on first execution instead of at startup)")
+    print(f"loaded at import:        {', '.join(runs[-1]['loaded_at_import']) or '-'}")
+
+if __name__ == "__main__":
+    main()
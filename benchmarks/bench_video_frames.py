@@ -0,0 +1,45 @@
+"""
+MatrixVideoCombine 帧预处理基准 (CPU)
+对比旧路径 (整批 interpolate + numpy clip/*255/astype) 与融合 chunk 管线 iter_uint8_chunks，
+输出 720p / 1080p 下的 frames/sec。
+
+    python benchmarks/bench_video_frames.py --comfyui /path/to/ComfyUI
+"""
+from common import base_parser, setup, load_module, best_time
+
+RESOLUTIONS = {"720p": (720, 1280), "1080p": (1080, 1920)}
+
+def main():
+    parser = base_parser(__doc__)
+    parser.add_argument("--frames", type=int, default=48)
+    parser.add_argument("--aspect", default="4:3")
+    parser.add_argument("--mode", default="Stretch", choices=["Stretch", "Crop Center"])
+    args = parser.parse_args()
+    setup(args)
+
+    import numpy as np
+    import torch
+    vc = load_module("video_combine")
+    node = vc.MatrixVideoCombine()
+    torch.manual_seed(0)
+
+    for label, (h, w) in RESOLUTIONS.items():
+        images = torch.rand((args.frames, h, w, 3), dtype=torch.float32)
+
+        def legacy():
+            out = node.process_aspect_ratio(images, args.aspect, args.mode).cpu().numpy()
+            out = (np.clip(out, 0, 1) * 255).astype(np.uint8)
+            _, oh, ow, _ = out.shape
+            out = out[:, :oh - oh % 2, :ow - ow % 2, :]
+            return out
+
+        resize_to, crop_box = vc.compute_aspect_plan(h, w, args.aspect, args.mode, even_dims=True)
+        def fused():
+            for _ in vc.iter_uint8_chunks(images, resize_to, crop_box): pass
+
+        t_legacy = best_time(legacy, args.repeat)
+        t_fused = best_time(fused, args.repeat)
+        print(f"{label:>6} {args.mode:<11} legacy {args.frames / t_legacy:8.1f} fps | fused {args.frames / t_fused:8.1f} fps | x{t_legacy / t_fused:.2f}")
+
+if __name__ == "__main__":
+    main()
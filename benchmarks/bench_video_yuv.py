@@ -0,0 +1,100 @@
+"""
+MatrixVideoCombine 管道像素格式基准：rgb24 (ffmpeg 内 swscale 转 yuv420p) 对比 yuv420p (张量侧转换)
+- convert:  只测帧转换 (iter_uint8_chunks / iter_yuv420_chunks)，输出 frames/sec 与每帧管道字节数
+- encode:   端到端 combine_video (h264-mp4)，输出 frames/sec
+- PSNR:     两种模式的 MP4 各自解码回 rgb24，分别与源帧以及彼此比较；低于 --min-psnr 时退出码为 1
+没有 ffmpeg 时只运行 convert 部分。
+
+    python benchmarks/bench_video_yuv.py --frames 96 --crf 18
+"""
+import shutil
+import subprocess
+import tempfile
+import time
+
+from common import base_parser, setup, load_module, best_time
+
+RESOLUTIONS = {"720p": (720, 1280), "1080p": (1080, 1920)}
+
+def make_frames(n, h, w):
+    """平滑渐变 + 移动的色块，比随机噪声更接近真实画面 (噪声会放大色度下采样的差异)。"""
+    import torch
+    ys = torch.linspace(0, 1, h).view(1, h, 1)
+    xs = torch.linspace(0, 1, w).view(1, 1, w)
+    t = torch.arange(n, dtype=torch.float32).view(n, 1, 1) / max(1, n)
+    r = (xs + t) % 1.0
+    g = ys.expand(n, h, w)
+    b = 0.5 + 0.5 * torch.sin(6.28 * (xs * 3 + ys * 2 + t))
+    frames = torch.stack([r.expand(n, h, w), g, b.expand(n, h, w)], dim=-1).contiguous()
+    size = h // 4
+    for i in range(n):
+        y0 = int((h - size) * (i / max(1, n - 1)))
+        x0 = int((w - size) * ((i * 7 % n) / max(1, n)))
+        frames[i, y0:y0 + size, x0:x0 + size] = torch.tensor([0.9, 0.2, 0.1])
+    return frames
+
+def decode_rgb(ffmpeg, path, w, h):
+    import numpy as np
+    raw = subprocess.run([ffmpeg, "-v", "error", "-i", path, "-f", "rawvideo", "-pix_fmt", "rgb24", "-"], stdout=subprocess.PIPE, check=True).stdout
+    return np.frombuffer(raw, dtype=np.uint8).reshape(-1, h, w, 3)
+
+def psnr(a, b):
+    import numpy as np
+    mse = np.mean((a.astype(np.float64) - b.astype(np.float64)) ** 2)
+    return float("inf") if mse == 0 else 10 * np.log10(255.0 ** 2 / mse)
+
+def main():
+    parser = base_parser(__doc__)
+    parser.add_argument("--frames", type=int, default=48)
+    parser.add_argument("--crf", type=int, default=18)
+    parser.add_argument("--min-psnr", type=float, default=38.0)
+    args = parser.parse_args()
+    setup(args)
+
+    vc = load_module("video_combine")
+    node = vc.MatrixVideoCombine()
+    ffmpeg = vc.get_ffmpeg_path()
+    failed = False
+
+    for label, (h, w) in RESOLUTIONS.items():
+        frames = make_frames(args.frames, h, w)
+        crop_box = (0, 0, h, w)
+        rates = {}
+        for fmt, chunks in (("rgb24", vc.iter_uint8_chunks), ("yuv420p", vc.iter_yuv420_chunks)):
+            def convert():
+                for _ in chunks(frames, None, crop_box): pass
+            rates[fmt] = args.frames / best_time(convert, args.repeat)
+        print(f"{label:>6} convert  rgb24 {rates['rgb24']:8.1f} fps ({h * w * 3} B/frame) | yuv420p {rates['yuv420p']:8.1f} fps ({h * w * 3 // 2} B/frame)")
+
+        if ffmpeg is None:
+            print(f"{label:>6} encode   ffmpeg not found, skipped")
+            continue
+
+        import folder_paths
+        out_dir = tempfile.mkdtemp(prefix="matrix_yuv_")
+        old_output = folder_paths.get_output_directory
+        folder_paths.get_output_directory = lambda: out_dir
+        try:
+            paths, fps = {}, {}
+            for fmt in ("rgb24", "yuv420p"):
+                t0 = time.perf_counter()
+                result = node.combine_video(frames, 24, 0, f"yuv_bench/{fmt}", "video/h264-mp4", args.crf, False, "Original", "Crop Center", pipe_format=fmt)
+                fps[fmt] = args.frames / (time.perf_counter() - t0)
+                paths[fmt] = result["result"][0]
+            print(f"{label:>6} encode   rgb24 {fps['rgb24']:8.1f} fps | yuv420p {fps['yuv420p']:8.1f} fps | x{fps['yuv420p'] / fps['rgb24']:.2f}")
+
+            source = next(vc.iter_uint8_chunks(frames, None, crop_box, chunk_size=args.frames))[1]
+            decoded = {fmt: decode_rgb(ffmpeg, path, w, h) for fmt, path in paths.items()}
+            p_rgb, p_yuv, p_cross = psnr(decoded["rgb24"], source), psnr(decoded["yuv420p"], source), psnr(decoded["yuv420p"], decoded["rgb24"])
+            print(f"{label:>6} PSNR     rgb24 vs source {p_rgb:6.2f} dB | yuv420p vs source {p_yuv:6.2f} dB | yuv420p vs rgb24 {p_cross:6.2f} dB")
+            if p_cross < args.min_psnr or p_yuv < p_rgb - 1.0: failed = True
+        finally:
+            folder_paths.get_output_directory = old_output
+            shutil.rmtree(out_dir, ignore_errors=True)
+
+    if failed:
+        print(f"PSNR check failed (min {args.min_psnr} dB against the rgb24 output, at most 1 dB below it against the source)")
+        raise SystemExit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+"""
+Benchmark 公共工具
+- 把仓库目录作为包导入 (子模块之间使用相对导入，不能直接 import 单个文件)
+- 默认使用 benchmarks/stubs 中的 folder_paths / comfy.utils / node_helpers 替身，无需完整 ComfyUI；
+  指定 --comfyui 时真实模块优先 (替身只排在 sys.path 末尾兜底)
+- 结果追加到 benchmarks/results/history.jsonl，便于跨版本对比
+"""
+import argparse
+import importlib
+import importlib.util
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+
+BENCH_DIR = os.path.abspath(os.path.dirname(__file__))
+REPO_ROOT = os.path.abspath(os.path.join(BENCH_DIR, ".."))
+STUBS_DIR = os.path.join(BENCH_DIR, "stubs")
+HISTORY_PATH = os.path.join(BENCH_DIR, "results", "history.jsonl")
+PACKAGE_NAME = "matrix_nodes"
+
+def base_parser(description):
+    parser = argparse.ArgumentParser(description=description)
+    parser.add_argument("--comfyui", default=os.environ.get("COMFYUI_PATH", ""), help="ComfyUI 根目录 (使用真实的 folder_paths / comfy 模块)")
+    parser.add_argument("--no-stubs", action="store_true", help="不加载替身模块")
+    parser.add_argument("--repeat", type=int, default=3, help="每项测量重复次数，取最优值")
+    return parser
+
+def setup(args):
+    if args.comfyui and args.comfyui not in sys.path:
+        sys.path.insert(0, args.comfyui)
+    if not args.no_stubs and STUBS_DIR not in sys.path:
+        sys.path.append(STUBS_DIR)
+
+def load_package():
+    if PACKAGE_NAME in sys.modules: return sys.modules[PACKAGE_NAME]
+    spec = importlib.util.spec_from_file_location(PACKAGE_NAME, os.path.join(REPO_ROOT, "__init__.py"), submodule_search_locations=[REPO_ROOT])
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[PACKAGE_NAME] = module
+    spec.loader.exec_module(module)
+    return module
+
+def load_module(name):
+    load_package()
+    return importlib.import_module(f"{PACKAGE_NAME}.{name}")
+
+def best_time(fn, repeat=3, warmup=1):
+    for _ in range(warmup): fn()
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - t0)
+    return best
+
+def git_commit():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=REPO_ROOT, stderr=subprocess.DEVNULL).decode().strip()
+    except Exception:
+        return "unknown"
+
+def load_history():
+    if not os.path.exists(HISTORY_PATH): return []
+    with open(HISTORY_PATH, "r", encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+def append_history(results):
+    """results: {指标名: 数值 (越大越好)}，追加一条带提交号 / 主机信息的记录并返回。"""
+    try:
+        import torch
+        torch_version = torch.__version__
+    except Exception:
+        torch_version = None
+    record = {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "commit": git_commit(),
+        "host": platform.node(),
+        "python": platform.python_version(),
+        "torch": torch_version,
+        "results": results,
+    }
+    os.makedirs(os.path.dirname(HISTORY_PATH), exist_ok=True)
+    with open(HISTORY_PATH, "a", encoding="utf-8") as f:
+        f.write(json.dumps(record) + "\n")
+    return record
@@ -0,0 +1,31 @@
+"""
+CLIP / VAE 的替身对象，接口与 ComfyUI 中 Qwen 编码节点用到的部分一致。
+计算量很小，基准测到的是节点自身的开销 (重排、缩放、缓存命中等)。
+"""
+import torch
+import torch.nn.functional as F
+
+class FakeCLIP:
+    def __init__(self, dim=64, tokens=77):
+        self.dim = dim
+        self.tokens = tokens
+
+    def tokenize(self, text, images=None, llama_template=None):
+        return {"text": text, "images": images or []}
+
+    def encode_from_tokens_scheduled(self, tokens):
+        cond = torch.zeros((1, self.tokens, self.dim))
+        return [[cond, {"pooled_output": None}]]
+
+class FakeVAE:
+    """encode: (B, H, W, 3) -> (B, 16, H/8, W/8)，记录调用次数便于检查缓存是否生效。"""
+    def __init__(self, channels=16, scale=8):
+        self.channels = channels
+        self.scale = scale
+        self.encode_calls = 0
+
+    def encode(self, pixels):
+        self.encode_calls += 1
+        x = pixels.movedim(-1, 1)
+        x = F.avg_pool2d(x, self.scale)
+        return x.mean(dim=1, keepdim=True).expand(-1, self.channels, -1, -1).contiguous()
@@ -0,0 +1,176 @@
+"""
+离线基准套件：不需要完整 ComfyUI (使用 stubs 替身 + fakes 中的 CLIP/VAE)。
+覆盖 加载器查找 / 解码 / 文本拆分与提取 / 拼图 / 数据集保存 / 视频管道 / Qwen 编码，
+结果追加到 benchmarks/results/history.jsonl，并与同一主机上一次记录对比。
+
+    python benchmarks/run_all.py            # 全部
+    python benchmarks/run_all.py --only grid,dataset --quick
+"""
+import os
+import shutil
+import tempfile
+import time
+
+from common import base_parser, setup, load_package, load_module, best_time, append_history, load_history
+import synthetic
+
+BENCHES = {}
+
+def bench(name):
+    def register(fn):
+        BENCHES[name] = fn
+        return fn
+    return register
+
+def rate(n, seconds):
+    return round(n / seconds, 2) if seconds > 0 else 0.0
+
+@bench("loader")
+def bench_loader(ctx):
+    pkg = ctx["pkg"]
+    folder = os.path.join(ctx["workdir"], "lookup")
+    # 8px 的小图：查找不关心内容，遍历器需要能解码
+    names = synthetic.make_asset_folder(folder, ctx["n_files"], image_size=8)
+    direct = pkg.MatrixImageLoader_Direct10()
+    index = pkg.MatrixImageLoader_Index10()
+    ids = [os.path.splitext(n)[0].split("-")[0].split("_")[0].split(" ")[0] for n in names[:: max(1, len(names) // 50)]]
+    n_lookup = len(ids)
+    t_smart = best_time(lambda: [direct.find_file_smart(folder, i) for i in ids], ctx["repeat"])
+    t_index = best_time(lambda: [index.find_indexed_file(folder, "X", k) for k in range(1, n_lookup + 1)], ctx["repeat"])
+    iterator = pkg.MatrixFolderIterator()
+    t_iter = best_time(lambda: [iterator.load_image_by_index(folder, k, "Contains", "", "All", "White") for k in range(n_lookup)], ctx["repeat"])
+    return {
+        "loader.find_file_smart_per_s": rate(n_lookup, t_smart),
+        "loader.find_indexed_file_per_s": rate(n_lookup, t_index),
+        "iterator.load_by_index_per_s": rate(n_lookup, t_iter),
+    }
+
+@bench("decode")
+def bench_decode(ctx):
+    pkg = ctx["pkg"]
+    folder = os.path.join(ctx["workdir"], "decode")
+    names = synthetic.make_asset_folder(folder, 10, image_size=ctx["image_size"])
+    paths = [os.path.join(folder, n) for n in names]
+    t = best_time(lambda: [pkg.load_image_file(p) for p in paths], ctx["repeat"])
+    return {f"decode.images_per_s@{ctx['image_size']}": rate(len(paths), t)}
+
+@bench("text")
+def bench_text(ctx):
+    pkg = ctx["pkg"]
+    text = synthetic.make_prompt_text(n_brackets=50)
+    splitter = pkg.MatrixPromptSplitter10()
+    extractor = pkg.MatrixTextExtractor()
+    chopper = pkg.MatrixStringChopper()
+    n = 2000
+    t_split = best_time(lambda: [splitter.split_text(text, "[]", "|", (k % 50) + 1) for k in range(n)], ctx["repeat"])
+    t_auto = best_time(lambda: [extractor.extract(text, "Auto (Smart 3-5 chars)", (k % 20) + 1, 40, "Any (A-Z,0-9)", "Any (A-Z,0-9)", "Any (A-Z,0-9)", "Ignore (End)", "Ignore (End)") for k in range(n)], ctx["repeat"])
+    t_custom = best_time(lambda: [extractor.extract(text, "Custom (Define Slots)", (k % 20) + 1, 0, "Letter (A-Z)", "Digit (0-9)", "Digit (0-9)", "Ignore (End)", "Ignore (End)") for k in range(n)], ctx["repeat"])
+    t_chop = best_time(lambda: [chopper.chop(text, "[", "]", (k % 50) + 1, False) for k in range(n)], ctx["repeat"])
+    return {
+        "text.splitter_per_s": rate(n, t_split),
+        "text.extractor_auto_per_s": rate(n, t_auto),
+        "text.extractor_custom_per_s": rate(n, t_custom),
+        "text.chopper_per_s": rate(n, t_chop),
+    }
+
+@bench("grid")
+def bench_grid(ctx):
+    grid = load_module("matrix_grid")
+    size = ctx["image_size"]
+    inputs = {f"img_{i}": synthetic.make_batch(1, size, size, seed=i) for i in range(1, 11)}
+    node = grid.MatrixAssetGrid10()
+    t_tensor = best_time(lambda: node.create_grid(256, 5, True, "Tensor", **inputs), ctx["repeat"])
+    t_pil = best_time(lambda: node.create_grid(256, 5, True, "PIL", **inputs), ctx["repeat"])
+    sheet = grid.MatrixContactSheet()
+    frames = synthetic.make_batch(ctx["sheet_frames"], 360, 640)
+    t_sheet = best_time(lambda: sheet.create_sheet(96, 20, True, 0, images=frames), ctx["repeat"])
+    return {
+        "grid.tensor_per_s": rate(1, t_tensor),
+        "grid.pil_per_s": rate(1, t_pil),
+        "grid.contact_sheet_frames_per_s": rate(ctx["sheet_frames"], t_sheet),
+    }
+
+@bench("dataset")
+def bench_dataset(ctx):
+    ds = load_module("matrix_dataset")
+    images = synthetic.make_batch(ctx["batch"], 512, 512)
+    node = ds.MatrixDatasetSaver()
+    node.output_dir = os.path.join(ctx["workdir"], "dataset")
+    results = {}
+    for mode in ("Sync", "Async"):
+        t = best_time(lambda: node.save_dataset(images, "a photo", "bench/img", "png", 95, save_mode=mode, wait_for_pending=True), ctx["repeat"])
+        results[f"dataset.{mode.lower()}_images_per_s"] = rate(len(images), t)
+    return results
+
+@bench("video")
+def bench_video(ctx):
+    vc = load_module("video_combine")
+    node = vc.MatrixVideoCombine()
+    if node.get_ffmpeg_path() is None:
+        print("  video: ffmpeg not found, skipped")
+        return {}
+    frames = synthetic.make_batch(ctx["video_frames"], 720, 1280)
+    t = best_time(lambda: node.combine_video(frames, 24, 0, "bench/video", "video/h264-mp4", 23, False, "Original", "Crop Center"), ctx["repeat"], warmup=0)
+    return {"video.h264_720p_fps": rate(len(frames), t)}
+
+@bench("qwen")
+def bench_qwen(ctx):
+    from fakes import FakeCLIP, FakeVAE
+    qwen = load_module("qwen_encode")
+    node = qwen.MatrixTextEncodeQwen5()
+    size = ctx["image_size"]
+    images = {f"image{i}": synthetic.make_batch(1, size, size, seed=i) for i in range(1, 6)}
+    clip, vae = FakeCLIP(), FakeVAE()
+    t = best_time(lambda: node.encode(clip, "make it blue", "", False, "image1", vae=vae, **images), ctx["repeat"])
+    return {"qwen.encode5_per_s": rate(1, t)}
+
+def compare(record, history):
+    host = record["host"]
+    previous = next((r for r in reversed(history) if r.get("host") == host), None)
+    print(f"\n{'metric':<42}{'value':>14}{'prev':>14}{'delta':>9}")
+    for key, value in sorted(record["results"].items()):
+        prev = previous["results"].get(key) if previous else None
+        delta = f"{(value - prev) / prev * 100:+.1f}%" if prev else ""
+        prev_str = f"{prev:.2f}" if prev is not None else "-"
+        print(f"{key:<42}{value:>14.2f}{prev_str:>14}{delta:>9}")
+    if previous: print(f"\n(previous: {previous['commit']} @ {previous['timestamp']})")
+
+def main():
+    parser = base_parser(__doc__)
+    parser.add_argument("--only", default="", help="逗号分隔的子集: " + ",".join(BENCHES))
+    parser.add_argument("--quick", action="store_true", help="缩小数据规模")
+    parser.add_argument("--no-record", action="store_true", help="不写入 history.jsonl")
+    args = parser.parse_args()
+    setup(args)
+
+    workdir = tempfile.mkdtemp(prefix="matrix_bench_data_")
+    ctx = {
+        "pkg": load_package(),
+        "workdir": workdir,
+        "repeat": args.repeat,
+        "n_files": 500 if args.quick else 5000,
+        "image_size": 512 if args.quick else 1024,
+        "batch": 8 if args.quick else 32,
+        "sheet_frames": 100 if args.quick else 1000,
+        "video_frames": 24 if args.quick else 96,
+    }
+    selected = [n for n in args.only.split(",") if n] or list(BENCHES)
+    results = {}
+    try:
+        for name in selected:
+            t0 = time.perf_counter()
+            print(f"[{name}] ...")
+            results.update(BENCHES[name](ctx))
+            print(f"  done in {time.perf_counter() - t0:.1f}s")
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    history = load_history()
+    if args.no_record:
+        record = {"host": None, "results": results}
+    else:
+        record = append_history(results)
+    compare(record, history)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,9 @@
+"""comfy.utils 的轻量替身：仅 common_upscale。"""
+import torch.nn.functional as F
+
+_MODES = {"nearest-exact": "nearest-exact", "bilinear": "bilinear", "area": "area", "bicubic": "bicubic", "lanczos": "bicubic"}
+
+def common_upscale(samples, width, height, upscale_method, crop):
+    mode = _MODES.get(upscale_method, "bilinear")
+    kwargs = {"align_corners": False} if mode in ("bilinear", "bicubic") else {}
+    return F.interpolate(samples, size=(height, width), mode=mode, **kwargs)
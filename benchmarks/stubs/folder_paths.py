@@ -0,0 +1,37 @@
+"""
+ComfyUI folder_paths 的轻量替身：只实现本仓库用到的接口。
+输出 / 临时目录默认放在系统临时目录下，可用 MATRIX_BENCH_DIR 指定。
+"""
+import os
+import re
+import tempfile
+
+_base_dir = os.environ.get("MATRIX_BENCH_DIR") or tempfile.mkdtemp(prefix="matrix_bench_")
+output_directory = os.path.join(_base_dir, "output")
+temp_directory = os.path.join(_base_dir, "temp")
+os.makedirs(output_directory, exist_ok=True)
+os.makedirs(temp_directory, exist_ok=True)
+
+def get_output_directory():
+    return output_directory
+
+def get_temp_directory():
+    return temp_directory
+
+def set_output_directory(path):
+    global output_directory
+    output_directory = path
+    os.makedirs(path, exist_ok=True)
+
+def get_save_image_path(filename_prefix, output_dir, image_width=0, image_height=0):
+    subfolder = os.path.dirname(os.path.normpath(filename_prefix))
+    filename = os.path.basename(os.path.normpath(filename_prefix))
+    full_output_folder = os.path.join(output_dir, subfolder)
+    os.makedirs(full_output_folder, exist_ok=True)
+    # 与 ComfyUI 一致：counter = 已有 "{filename}_{数字}_*" 文件的最大编号 + 1
+    pattern = re.compile(re.escape(filename) + r"_(\d+)_")
+    counter = 1
+    for f in os.listdir(full_output_folder):
+        m = pattern.match(f)
+        if m: counter = max(counter, int(m.group(1)) + 1)
+    return full_output_folder, filename, counter, subfolder, filename_prefix
@@ -0,0 +1,15 @@
+"""node_helpers 的轻量替身：仅 conditioning_set_values (与 ComfyUI 行为一致)。"""
+
+def conditioning_set_values(conditioning, values={}, append=False):
+    c = []
+    for t in conditioning:
+        n = [t[0], t[1].copy()]
+        for k in values:
+            val = values[k]
+            if append:
+                old_val = n[1].get(k, None)
+                if old_val is not None:
+                    val = old_val + val
+            n[1][k] = val
+        c.append(n)
+    return c
@@ -0,0 +1,13 @@
+"""soundfile 的轻量替身：只在未安装 soundfile 时生效，用标准库 wave 写 16-bit PCM。"""
+import wave
+import numpy as np
+
+def write(file, data, samplerate):
+    data = np.asarray(data, dtype=np.float32)
+    channels = 1 if data.ndim == 1 else data.shape[1]
+    pcm = (np.clip(data, -1, 1) * 32767).astype("<i2")
+    with wave.open(file, "wb") as w:
+        w.setnchannels(channels)
+        w.setsampwidth(2)
+        w.setframerate(int(samplerate))
+        w.writeframes(pcm.tobytes())
@@ -0,0 +1,45 @@
+"""合成测试数据：资产文件夹、文本块、图片批次。"""
+import os
+import random
+
+PREFIXES = ["X", "Y", "Z", "A", "B", "C", "D", "E", "F", "G"]
+DESCRIPTIONS = ["", "-front", "_side", " back view", "-角色"]
+
+def make_asset_folder(folder, n_files, image_size=0, seed=0):
+    """
+    生成 n_files 个资产文件 (X1.png, Y02-front.jpg ...)。
+    image_size=0 时写空文件 (只测查找)，否则写真实的随机图片 (测解码)。
+    """
+    os.makedirs(folder, exist_ok=True)
+    rng = random.Random(seed)
+    names = []
+    if image_size:
+        import numpy as np
+        from PIL import Image
+    for i in range(n_files):
+        prefix = PREFIXES[i % len(PREFIXES)]
+        number = i // len(PREFIXES) + 1
+        num_str = f"{number:02d}" if rng.random() < 0.5 else str(number)
+        ext = rng.choice(["png", "jpg", "webp"])
+        name = f"{prefix}{num_str}{rng.choice(DESCRIPTIONS)}.{ext}"
+        path = os.path.join(folder, name)
+        if image_size:
+            arr = np.random.default_rng(i).integers(0, 255, (image_size, image_size, 3), dtype=np.uint8)
+            Image.fromarray(arr).save(path)
+        else:
+            open(path, "wb").close()
+        names.append(name)
+    return names
+
+def make_prompt_text(n_brackets=20, items=10, seed=0):
+    rng = random.Random(seed)
+    parts = []
+    for _ in range(n_brackets):
+        ids = "|".join(f"{rng.choice(PREFIXES)}{rng.randint(1, 99)}" for _ in range(items))
+        parts.append(f"scene {rng.randint(1, 999)}: [{ids}] 003: a cat sitting on a mat, {rng.random():.3f}")
+    return "\n".join(parts)
+
+def make_batch(n, height, width, seed=0):
+    import torch
+    torch.manual_seed(seed)
+    return torch.rand((n, height, width, 3), dtype=torch.float32)
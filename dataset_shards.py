@@ -0,0 +1,164 @@
+# -*- coding: utf-8 -*-
+"""
+数据集分片读写：WebDataset 风格的 tar 分片 + 每批一个 JSONL 清单。
+写入方：MatrixDatasetSaver；读取方：MatrixFolderIterator 和 MatrixContactSheet。
+Index / Direct 加载器只按文件名查找文件夹里的图片，不展开分片成员。
+增量导出状态 (每个输出槽位的图片 / caption 内容哈希) 也在这里读写。
+"""
+import io
+import json
+import os
+import re
+import tarfile
+import tempfile
+import threading
+import time
+from .matrix_profiler import count as profile_count
+
+IMAGE_EXTS = (".png", ".jpg", ".jpeg", ".webp", ".bmp")
+MANIFEST_SUFFIX = "_manifest.jsonl"
+EXPORT_STATE_SUFFIX = "_export_state.json"
+EXPORT_STATE_VERSION = 1
+
+# tar 路径 -> (mtime_ns, size, {成员名: (数据偏移, 长度)})，同一分片只解析一次目录
+_TAR_INDEX = {}
+# 清单路径 -> (mtime_ns, size, {文件名: caption})
+_MANIFEST_CACHE = {}
+_CACHE_LOCK = threading.Lock()
+
+def is_shard_member(name):
+    return ".tar/" in name
+
+def split_shard_member(name):
+    tar_name, member = name.split(".tar/", 1)
+    return tar_name + ".tar", member
+
+def _add_bytes(tar, name, data):
+    info = tarfile.TarInfo(name)
+    info.size = len(data)
+    info.mtime = int(time.time())
+    tar.addfile(info, io.BytesIO(data))
+
+def write_tar_shard(path, samples):
+    """
+    samples: [(key, ext, 图片字节, caption)]。同一 key 的图片与 .txt 相邻存放 (WebDataset 约定)。
+    先写临时文件再原子替换，读取方不会看到写了一半的分片。
+    """
+    tmp_path = path + ".tmp"
+    with tarfile.open(tmp_path, "w") as tar:
+        for key, ext, data, caption in samples:
+            _add_bytes(tar, f"{key}.{ext}", data)
+            _add_bytes(tar, f"{key}.txt", caption.encode("utf-8"))
+    os.replace(tmp_path, path)
+
+def write_manifest(path, entries):
+    """entries: [(文件名, caption)]，每行一个 JSON 对象。"""
+    with open(path, "w", encoding="utf-8") as f:
+        for file_name, caption in entries:
+            f.write(json.dumps({"file": file_name, "caption": caption}, ensure_ascii=False) + "\n")
+
+def read_export_state(path):
+    """返回 {槽位名: {"image": ..., "caption": ..., "options": ...}}；文件不存在或损坏时返回空字典 (全部重写)。"""
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            state = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    if not isinstance(state, dict) or state.get("version") != EXPORT_STATE_VERSION: return {}
+    slots = state.get("slots")
+    return slots if isinstance(slots, dict) else {}
+
+# 状态文件路径 -> 锁：同一文件的读-改-写串行化 (Async 模式下多个批次的提交可能落在不同的后台线程)
+_STATE_LOCKS = {}
+
+def update_export_state(path, slots, dropped=()):
+    """把本批次的槽位合并进文件当前的内容 (其他批次写入的槽位保留)；dropped 中的槽位删除。"""
+    with _CACHE_LOCK:
+        lock = _STATE_LOCKS.setdefault(os.path.normcase(os.path.abspath(path)), threading.Lock())
+    with lock:
+        state = read_export_state(path)
+        state.update(slots)
+        for stem in dropped: state.pop(stem, None)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path) or ".", suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump({"version": EXPORT_STATE_VERSION, "slots": state}, f, ensure_ascii=False, separators=(",", ":"))
+            os.replace(tmp_path, path)
+        except BaseException:
+            try: os.remove(tmp_path)
+            except OSError: pass
+            raise
+
+def _cached(cache, path, build):
+    st = os.stat(path)
+    with _CACHE_LOCK:
+        hit = cache.get(path)
+        if hit is not None and hit[0] == st.st_mtime_ns and hit[1] == st.st_size:
+            profile_count("cache_hits")
+            return hit[2]
+    profile_count("cache_misses")
+    value = build(path)
+    with _CACHE_LOCK:
+        cache[path] = (st.st_mtime_ns, st.st_size, value)
+    return value
+
+def _build_tar_index(path):
+    index = {}
+    with tarfile.open(path, "r") as tar:
+        for info in tar:
+            if info.isfile(): index[info.name] = (info.offset_data, info.size)
+    return index
+
+def list_tar_members(path):
+    """返回分片内的图片成员名 (已排序)。"""
+    index = _cached(_TAR_INDEX, path, _build_tar_index)
+    return sorted(name for name in index if name.lower().endswith(IMAGE_EXTS))
+
+def read_tar_member(path, member):
+    """按缓存的偏移直接读取成员字节，不重新解析 tar；成员不存在返回 None。"""
+    entry = _cached(_TAR_INDEX, path, _build_tar_index).get(member)
+    if entry is None: return None
+    offset, size = entry
+    with open(path, "rb") as f:
+        f.seek(offset)
+        return f.read(size)
+
+def _build_manifest(path):
+    captions = {}
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line: continue
+            try:
+                row = json.loads(line)
+                captions[row["file"]] = row.get("caption", "")
+            except (ValueError, KeyError, TypeError):
+                continue
+    return captions
+
+def read_manifest(path):
+    return _cached(_MANIFEST_CACHE, path, _build_manifest)
+
+def next_counter(folder, filename, counter):
+    """
+    get_save_image_path 只从 "前缀_NNNNN_.tar" / "前缀_NNNNN_manifest.jsonl" 里读到每批的起始编号；
+    这里按已有分片成员和清单条目的编号返回下一个可用 counter，重启后也不会与旧分片里的 key 重复。
+    """
+    pattern = re.compile(re.escape(filename) + r"_(\d+)_")
+    try:
+        names = os.listdir(folder)
+    except OSError:
+        return counter
+    for name in names:
+        if not name.startswith(f"{filename}_"): continue
+        path = os.path.join(folder, name)
+        try:
+            if name.endswith("_.tar"): keys = list_tar_members(path)
+            elif name.endswith(MANIFEST_SUFFIX): keys = read_manifest(path)
+            else: continue
+        except (OSError, ValueError, tarfile.TarError):
+            continue
+        for key in keys:
+            m = pattern.match(key)
+            if m: counter = max(counter, int(m.group(1)) + 1)
+    return counter
@@ -0,0 +1,171 @@
+# -*- coding: utf-8 -*-
+"""
+文件夹监视：让 asset_resolver 的 FolderCatalog 在文件变化时才失效，热文件夹上的查找不再有任何系统调用。
+通过环境变量 MATRIX_NODES_FOLDER_WATCH 开启 (默认关闭，此时每次查找 stat 一次目录)：
+- "1" / "auto" / "inotify": Linux 下用 inotify (ctypes，无额外依赖)，不可用时退回轮询
+- "poll": 后台线程每隔 MATRIX_NODES_FOLDER_WATCH_INTERVAL 秒 (默认 1) stat 一次被监视的目录
+"""
+import ctypes
+import ctypes.util
+import errno
+import os
+import select
+import struct
+import sys
+import threading
+import time
+
+WATCH_ENV = "MATRIX_NODES_FOLDER_WATCH"
+INTERVAL_ENV = "MATRIX_NODES_FOLDER_WATCH_INTERVAL"
+
+# inotify 常量 (linux/inotify.h)
+IN_ATTRIB = 0x00000004
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ONLYDIR = 0x01000000
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+# 只关心名字变化和写完 / touch，不监听 IN_MODIFY (写入过程中每次 write 都会触发)
+WATCH_MASK = (IN_ATTRIB | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE
+              | IN_DELETE_SELF | IN_MOVE_SELF | IN_ONLYDIR)
+_EVENT = struct.Struct("iIII")
+
+class InotifyWatcher:
+    """一个 inotify fd + 一个后台读取线程；事件只把对应的 catalog 标记为 dirty。"""
+    kind = "inotify"
+
+    def __init__(self):
+        self.libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        self.fd = self.libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        self.lock = threading.Lock()
+        self.by_wd = {}
+        self.limit_reported = False
+        threading.Thread(target=self._run, name="MatrixFolderWatch", daemon=True).start()
+
+    def watch(self, catalog):
+        wd = self.libc.inotify_add_watch(self.fd, os.fsencode(catalog.folder), WATCH_MASK)
+        if wd < 0:
+            err = ctypes.get_errno()
+            if err == errno.ENOSPC and not self.limit_reported:
+                self.limit_reported = True
+                print("MatrixNodes Info: inotify watch limit reached (fs.inotify.max_user_watches), falling back to stat checks.")
+            return False
+        with self.lock:
+            self.by_wd[wd] = catalog
+        catalog.watch_handle = wd
+        return True
+
+    def unwatch(self, catalog):
+        wd = getattr(catalog, "watch_handle", None)
+        if wd is None: return
+        with self.lock:
+            self.by_wd.pop(wd, None)
+        self.libc.inotify_rm_watch(self.fd, wd)
+        catalog.watch_handle = None
+
+    def _run(self):
+        while True:
+            try:
+                select.select([self.fd], [], [])
+                data = os.read(self.fd, 64 * 1024)
+            except BlockingIOError:
+                continue
+            except OSError as e:
+                print(f"MatrixFolderWatch Error: {e}")
+                time.sleep(1.0)
+                continue
+            offset = 0
+            while offset + _EVENT.size <= len(data):
+                wd, mask, _, name_len = _EVENT.unpack_from(data, offset)
+                offset += _EVENT.size + name_len
+                self._handle(wd, mask)
+
+    def _handle(self, wd, mask):
+        if mask & IN_Q_OVERFLOW:
+            # 事件队列溢出：不知道丢了什么，全部重扫
+            with self.lock:
+                catalogs = list(self.by_wd.values())
+            for catalog in catalogs: catalog.dirty = True
+            return
+        with self.lock:
+            catalog = self.by_wd.get(wd)
+            if catalog is not None and mask & IN_IGNORED:
+                # 目录被删除 / 卸载，内核已移除监视：退回 stat 检查
+                del self.by_wd[wd]
+        if catalog is None: return
+        if mask & IN_IGNORED:
+            catalog.watch_handle = None
+            catalog.watched = False
+        catalog.dirty = True
+
+class PollingWatcher:
+    """没有 inotify 时的后备：后台线程按间隔 stat 被监视的目录，mtime 变化才标记 dirty。"""
+    kind = "poll"
+
+    def __init__(self, interval):
+        self.interval = max(0.05, interval)
+        self.lock = threading.Lock()
+        self.catalogs = set()
+        threading.Thread(target=self._run, name="MatrixFolderPoll", daemon=True).start()
+
+    def watch(self, catalog):
+        with self.lock:
+            self.catalogs.add(catalog)
+        return True
+
+    def unwatch(self, catalog):
+        with self.lock:
+            self.catalogs.discard(catalog)
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+            with self.lock:
+                catalogs = list(self.catalogs)
+            for catalog in catalogs:
+                if catalog.dirty: continue
+                try:
+                    mtime_ns = os.stat(catalog.folder).st_mtime_ns
+                except OSError:
+                    catalog.dirty = True
+                    continue
+                # mtime 精度有限：扫描时 mtime 还"太新"的目录也要重扫一次
+                if mtime_ns != catalog.mtime_ns or not catalog.stable:
+                    catalog.dirty = True
+
+_WATCHER = None
+_WATCHER_LOCK = threading.Lock()
+_WATCHER_READY = False
+
+def get_watcher():
+    """按环境变量创建进程内唯一的监视器；未开启时返回 None。"""
+    global _WATCHER, _WATCHER_READY
+    if _WATCHER_READY: return _WATCHER
+    with _WATCHER_LOCK:
+        if _WATCHER_READY: return _WATCHER
+        mode = os.environ.get(WATCH_ENV, "").strip().lower()
+        try:
+            interval = float(os.environ.get(INTERVAL_ENV, "1.0"))
+        except ValueError:
+            interval = 1.0
+        if mode in ("", "0", "off", "false", "no"):
+            _WATCHER = None
+        elif mode == "poll" or not sys.platform.startswith("linux"):
+            _WATCHER = PollingWatcher(interval)
+        else:
+            try:
+                _WATCHER = InotifyWatcher()
+            except Exception as e:
+                print(f"MatrixNodes Info: inotify unavailable ({e}), polling folders every {interval}s.")
+                _WATCHER = PollingWatcher(interval)
+        _WATCHER_READY = True
+    return _WATCHER
@@ -0,0 +1,73 @@
+# -*- coding: utf-8 -*-
+"""
+图像张量公共工具：float IMAGE -> uint8 的统一转换，以及加载器紧凑精度输出 (fp16 / uint8) 的互转。
+Video Combine / Dataset Saver / Asset Grid / Qwen Encode 共用，保证各条路径接受同样的输入精度。
+"""
+import warnings
+import numpy as np
+import torch
+
+# 每个 chunk 的帧数：float32 中间缓冲区只按 chunk 分配
+CHUNK_FRAMES = 16
+
+# 加载器输出精度：fp32 (ComfyUI 标准)、fp16 (半内存)、uint8 (1/4 内存，0-255，仅 Matrix 节点可直接消费)
+PRECISIONS = ["fp32", "fp16", "uint8"]
+
+def from_uint8_array(arr, precision="fp32"):
+    """
+    HWC uint8 numpy -> (1, H, W, C) IMAGE。uint8 零拷贝；fp16 直接从 uint8 转换，不经过 float32 中间结果。
+    只读数组 (磁盘缓存的 memmap)：uint8 复制一份，float 转换本身就会生成新张量，不复制。
+    """
+    if not arr.flags.writeable:
+        if precision == "uint8": return torch.from_numpy(np.array(arr))[None,]
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore", UserWarning)
+            t = torch.from_numpy(arr)
+    else:
+        t = torch.from_numpy(arr)
+    if precision == "uint8": return t[None,]
+    dtype = torch.float16 if precision == "fp16" else torch.float32
+    return t.to(dtype).div_(255)[None,]
+
+def cast_precision(images, precision):
+    """float IMAGE (占位图 / 报错图) 转为与加载器输出一致的精度。"""
+    if precision == "uint8":
+        if images.dtype == torch.uint8: return images
+        return images.float().clamp(0, 1).mul(255).round_().to(torch.uint8)
+    if precision == "fp16": return images.to(torch.float16)
+    return images
+
+def to_float_image(images):
+    """
+    消费方按需转换：uint8 (0-255) / fp16 -> float32 (0-1)，float32 原样返回 (不复制)。
+    """
+    if images.dtype == torch.uint8: return images.to(torch.float32).div_(255)
+    if images.dtype != torch.float32: return images.to(torch.float32)
+    return images
+
+def to_uint8_into(chunk, work, out):
+    """
+    chunk (float, 任意设备) -> out (uint8, CPU)。
+    clamp 写入复用的 work 缓冲区 (不修改上游张量)，原地 *255，copy_ 截断取整，与 numpy astype(uint8) 结果一致。
+    uint8 输入直接复制。
+    """
+    if chunk.dtype == torch.uint8:
+        out.copy_(chunk)
+        return
+    torch.clamp(chunk.to("cpu", torch.float32), 0, 1, out=work)
+    work.mul_(255)
+    out.copy_(work)
+
+def tensor_to_uint8(images, chunk_size=CHUNK_FRAMES):
+    """
+    整批转换为 uint8 numpy 数组 (B, H, W, C)。输出只分配一次，逐帧取 out[i] 即为零拷贝视图，可直接交给 Image.fromarray。
+    """
+    if images.dtype == torch.uint8:
+        return images.cpu().numpy()
+    batch = images.shape[0]
+    out = torch.empty(tuple(images.shape), dtype=torch.uint8)
+    work = torch.empty((min(chunk_size, batch),) + tuple(images.shape[1:]), dtype=torch.float32)
+    for start in range(0, batch, chunk_size):
+        end = min(start + chunk_size, batch)
+        to_uint8_into(images[start:end], work[:end - start], out[start:end])
+    return out.numpy()
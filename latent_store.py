@@ -0,0 +1,128 @@
+# -*- coding: utf-8 -*-
+"""
+Qwen 编码器的参考 Latent 离线库：vae.encode 的结果按 (VAE 身份, 图片内容哈希) 保存为 safetensors 文件。
+参考图库固定时，预计算一次，之后每个任务直接读取，不再重复 VAE 编码。
+- 图片哈希：先四舍五入到 uint8 再算 sha1，fp32 / fp16 / uint8 精度的加载器输出指向同一条记录
+- VAE 身份：类名 + 常见配置 + 权重抽样哈希 (每个 VAE 对象只计算一次)
+- 写入：同目录临时文件 + os.replace，多个 worker 共用同一目录也不会读到半个文件
+目录结构：<store>/<VAE 身份>/<图片哈希>.safetensors
+"""
+import hashlib
+import os
+import tempfile
+import threading
+import weakref
+import torch
+from .lazy_import import lazy_import
+from .matrix_cache import default_cache_root
+from .matrix_profiler import count as profile_count
+
+st = lazy_import("safetensors.torch")
+
+LATENT_KEY = "latent"
+# 每个权重张量只取这么多个元素参与身份哈希，避免把几百 MB 的权重搬回 CPU
+SAMPLE_ELEMENTS = 1024
+VAE_CONFIG_ATTRS = ("latent_channels", "downscale_ratio", "upscale_ratio", "latent_dim", "vae_dtype")
+
+def image_hash(image):
+    """(B, H, W, C) IMAGE -> 内容哈希 (只取前 3 个通道，与 vae.encode 的输入一致)。"""
+    image = image[..., :3]
+    if image.dtype != torch.uint8:
+        image = image.float().mul(255).round_().clamp_(0, 255).to(torch.uint8)
+    arr = image.cpu().contiguous().numpy()
+    h = hashlib.sha1(memoryview(arr).cast("B"))
+    h.update(repr(arr.shape).encode("utf-8"))
+    return h.hexdigest()
+
+_VAE_IDS = weakref.WeakKeyDictionary()
+_VAE_IDS_LOCK = threading.Lock()
+
+def _compute_vae_identity(vae):
+    h = hashlib.sha1(f"{type(vae).__module__}.{type(vae).__qualname__}".encode("utf-8"))
+    for name in VAE_CONFIG_ATTRS:
+        h.update(f"{name}={getattr(vae, name, None)!r};".encode("utf-8"))
+    model = getattr(vae, "first_stage_model", vae)
+    state_dict = model.state_dict() if hasattr(model, "state_dict") else {}
+    for key in sorted(state_dict):
+        tensor = state_dict[key]
+        h.update(f"{key}:{tuple(tensor.shape)}:{tensor.dtype};".encode("utf-8"))
+        flat = tensor.detach().reshape(-1)
+        step = max(1, flat.numel() // SAMPLE_ELEMENTS)
+        sample = flat[::step][:SAMPLE_ELEMENTS].to("cpu", torch.float32).contiguous().numpy()
+        h.update(memoryview(sample).cast("B"))
+    return h.hexdigest()[:16]
+
+def vae_identity(vae):
+    try:
+        with _VAE_IDS_LOCK:
+            ident = _VAE_IDS.get(vae)
+        if ident is not None: return ident
+    except TypeError:
+        # 不能弱引用的对象：每次重新计算
+        return _compute_vae_identity(vae)
+    ident = _compute_vae_identity(vae)
+    with _VAE_IDS_LOCK:
+        _VAE_IDS[vae] = ident
+    return ident
+
+class LatentStore:
+    def __init__(self, root):
+        self.root = root
+
+    def path_for(self, vae_id, key):
+        return os.path.join(self.root, vae_id, key + ".safetensors")
+
+    def get(self, vae_id, key):
+        path = self.path_for(vae_id, key)
+        if not os.path.exists(path):
+            profile_count("latent_store_misses")
+            return None
+        try:
+            latent = st.load_file(path)[LATENT_KEY]
+        except Exception as e:
+            print(f"MatrixLatentStore Error: {e}")
+            profile_count("latent_store_misses")
+            return None
+        profile_count("latent_store_hits")
+        return latent
+
+    def put(self, vae_id, key, latent):
+        path = self.path_for(vae_id, key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+        os.close(fd)
+        try:
+            st.save_file({LATENT_KEY: latent.detach().cpu().contiguous()}, tmp_path, metadata={"vae": vae_id})
+            os.replace(tmp_path, path)
+        except BaseException:
+            try: os.remove(tmp_path)
+            except OSError: pass
+            raise
+
+    def encode(self, vae, image, vae_id=None):
+        """命中时读取已保存的 latent，否则 vae.encode 并写入库。"""
+        vae_id = vae_id or vae_identity(vae)
+        key = image_hash(image)
+        latent = self.get(vae_id, key)
+        if latent is not None: return latent
+        latent = vae.encode(image[:, :, :, :3])
+        try:
+            self.put(vae_id, key, latent)
+        except Exception as e:
+            print(f"MatrixLatentStore Error: {e}")
+        return latent
+
+_STORES = {}
+_STORES_LOCK = threading.Lock()
+
+def get_latent_store(path):
+    """path 为空时返回 None (不使用离线库)；"default" 使用 ~/.cache/matrix_nodes/qwen_latents。"""
+    path = (path or "").strip()
+    if not path: return None
+    if path.lower() == "default": path = default_cache_root("qwen_latents")
+    path = os.path.abspath(os.path.expanduser(path))
+    with _STORES_LOCK:
+        store = _STORES.get(path)
+        if store is None:
+            store = _STORES[path] = LatentStore(path)
+    return store
@@ -0,0 +1,38 @@
+# -*- coding: utf-8 -*-
+"""
+延迟导入：模块代理在首次访问属性时才真正 import。
+ComfyUI 启动时只注册节点，soundfile / comfy.utils 等较重的依赖推迟到节点第一次执行时加载；
+依赖缺失时报错也发生在执行时，而不是让节点在启动时悄悄消失。
+"""
+import importlib
+import threading
+
+_lock = threading.Lock()
+
+class LazyModule:
+    def __init__(self, name):
+        self._name = name
+        self._module = None
+
+    def _load(self):
+        module = self._module
+        if module is None:
+            with _lock:
+                if self._module is None:
+                    try:
+                        self._module = importlib.import_module(self._name)
+                    except ImportError as e:
+                        raise ImportError(f"MatrixNodes: optional dependency '{self._name}' is not available ({e})") from e
+                module = self._module
+        return module
+
+    def __getattr__(self, attr):
+        # 只有实例上找不到的属性才会走到这里 (_name / _module 除外)
+        return getattr(self._load(), attr)
+
+    def __repr__(self):
+        state = "loaded" if self._module is not None else "not loaded"
+        return f"<LazyModule '{self._name}' ({state})>"
+
+def lazy_import(name):
+    return LazyModule(name)
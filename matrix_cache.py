@@ -0,0 +1,237 @@
+# -*- coding: utf-8 -*-
+"""
+持久化磁盘缓存：解码后的像素以原始 uint8 .npy 保存，读取时 np.load(mmap_mode="r")，冷启动只需缺页读入，不再解码 PNG。
+- 写入：同目录临时文件 + os.replace，多进程 / 多线程并发读写不会读到半个文件
+- 淘汰：总大小超过上限时按最近使用时间 (命中时 touch mtime) 删除最旧的文件，降到上限的 90%
+  总大小每 RESCAN_SECONDS 秒按磁盘实际内容重新统计一次，多个 worker 共用目录时也不会远超上限
+- 后台单线程写入，不阻塞节点执行
+
+解码帧缓存通过环境变量开启：
+- MATRIX_NODES_FRAME_CACHE: "1" 使用默认目录 (~/.cache/matrix_nodes/frames)，或直接填目录路径；留空关闭
+- MATRIX_NODES_FRAME_CACHE_MB: 大小上限 (默认 4096)
+
+缩略图缓存 (联系表的文件夹模式使用，按文件 路径 + mtime + 大小 索引)：内存 LRU 始终开启，磁盘层同样按环境变量开启：
+- MATRIX_NODES_THUMB_CACHE: "1" 使用默认目录 (~/.cache/matrix_nodes/thumbs)，或直接填目录路径；留空只用内存
+- MATRIX_NODES_THUMB_CACHE_MB: 磁盘层大小上限 (默认 1024)
+"""
+import hashlib
+import os
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+from .matrix_profiler import count as profile_count
+
+FRAME_CACHE_ENV = "MATRIX_NODES_FRAME_CACHE"
+FRAME_CACHE_MB_ENV = "MATRIX_NODES_FRAME_CACHE_MB"
+THUMB_CACHE_ENV = "MATRIX_NODES_THUMB_CACHE"
+THUMB_CACHE_MB_ENV = "MATRIX_NODES_THUMB_CACHE_MB"
+THUMB_MEMORY_BYTES = 256 * 1024 * 1024
+MAX_PENDING_WRITES = 8
+# 写入进程崩溃留下的临时文件，超过这个时间在淘汰时顺带清理
+STALE_TMP_SECONDS = 3600
+# 本进程只累计自己写入的字节；其他进程的写入靠定期重新扫描目录计入
+RESCAN_SECONDS = 60
+
+def default_cache_root(name):
+    base = os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache")
+    return os.path.join(base, "matrix_nodes", name)
+
+class DiskArrayCache:
+    def __init__(self, root, max_bytes, suffix=".npy"):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.suffix = suffix
+        self.lock = threading.Lock()
+        self.total_bytes = None   # 第一次写入时扫描目录得到，之后每 RESCAN_SECONDS 秒重新扫描
+        self.scanned_at = 0.0
+        self.pending = threading.BoundedSemaphore(MAX_PENDING_WRITES)
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="MatrixCacheWrite")
+
+    def path_for(self, key):
+        digest = hashlib.sha1(repr(key).encode("utf-8")).hexdigest()
+        return os.path.join(self.root, digest[:2], digest + self.suffix)
+
+    def get(self, key):
+        """命中返回只读 memmap 数组，否则 None。"""
+        path = self.path_for(key)
+        try:
+            arr = np.load(path, mmap_mode="r", allow_pickle=False)
+        except (OSError, ValueError):
+            profile_count("disk_cache_misses")
+            return None
+        try: os.utime(path)  # 记录最近使用，供淘汰排序
+        except OSError: pass
+        profile_count("disk_cache_hits")
+        return arr
+
+    def put(self, key, arr):
+        """后台写入；写入队列已满时直接放弃 (缓存只是加速，不影响结果)。"""
+        if not self.pending.acquire(blocking=False): return
+        def task():
+            try: self._write(key, arr)
+            except Exception as e: print(f"MatrixCache Error: {e}")
+            finally: self.pending.release()
+        self.executor.submit(task)
+
+    def _write(self, key, arr):
+        path = self.path_for(key)
+        if os.path.exists(path): return
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                np.save(f, np.ascontiguousarray(arr), allow_pickle=False)
+            os.replace(tmp_path, path)
+        except BaseException:
+            try: os.remove(tmp_path)
+            except OSError: pass
+            raise
+        size = os.path.getsize(path)
+        with self.lock:
+            if self.total_bytes is None or time.monotonic() - self.scanned_at > RESCAN_SECONDS:
+                self.total_bytes = sum(size for _, size, _ in self._entries())
+                self.scanned_at = time.monotonic()
+            else:
+                self.total_bytes += size
+            if self.total_bytes > self.max_bytes:
+                self._evict()
+
+    def _entries(self):
+        entries = []
+        if not os.path.isdir(self.root): return entries
+        for sub in os.scandir(self.root):
+            if not sub.is_dir(): continue
+            try:
+                it = list(os.scandir(sub.path))
+            except OSError:
+                continue
+            for entry in it:
+                try:
+                    st = entry.stat()
+                except OSError:
+                    continue
+                if entry.name.endswith(self.suffix):
+                    entries.append((st.st_mtime_ns, st.st_size, entry.path))
+                elif entry.name.endswith(".tmp") and time.time() - st.st_mtime > STALE_TMP_SECONDS:
+                    try: os.remove(entry.path)
+                    except OSError: pass
+        return entries
+
+    def _evict(self):
+        # 其他进程也可能在写，按磁盘实际内容重新统计
+        entries = sorted(self._entries())
+        total = sum(size for _, size, _ in entries)
+        target = self.max_bytes * 0.9
+        for _, size, path in entries:
+            if total <= target: break
+            try:
+                os.remove(path)
+                total -= size
+                profile_count("disk_cache_evictions")
+            except OSError:
+                # Windows 下仍被映射的文件删不掉，跳过
+                pass
+        self.total_bytes = total
+        self.scanned_at = time.monotonic()
+
+    def flush(self):
+        self.executor.submit(lambda: None).result()
+
+def disk_cache_from_env(env, mb_env, name, default_mb):
+    """环境变量为 "1" 时用默认目录，为路径时用该目录，留空 / "0" 返回 None。"""
+    setting = os.environ.get(env, "").strip()
+    if not setting or setting.lower() in ("0", "off", "false", "no"): return None
+    root = default_cache_root(name) if setting.lower() in ("1", "on", "true", "yes") else setting
+    try:
+        max_mb = float(os.environ.get(mb_env, str(default_mb)))
+    except ValueError:
+        max_mb = default_mb
+    return DiskArrayCache(root, int(max_mb * 1024 * 1024))
+
+_FRAME_CACHE = None
+_FRAME_CACHE_READY = False
+_FRAME_CACHE_LOCK = threading.Lock()
+
+def get_frame_cache():
+    """按环境变量创建解码帧缓存；未开启返回 None。"""
+    global _FRAME_CACHE, _FRAME_CACHE_READY
+    if _FRAME_CACHE_READY: return _FRAME_CACHE
+    with _FRAME_CACHE_LOCK:
+        if _FRAME_CACHE_READY: return _FRAME_CACHE
+        _FRAME_CACHE = disk_cache_from_env(FRAME_CACHE_ENV, FRAME_CACHE_MB_ENV, "frames", 4096)
+        _FRAME_CACHE_READY = True
+    return _FRAME_CACHE
+
+def frame_key(path, st):
+    return ("frame", os.path.abspath(path), st.st_mtime_ns, st.st_size)
+
+# ========================================================
+# 缩略图缓存
+# ========================================================
+
+class ThumbnailCache:
+    """内存 LRU (按字节计) + 可选的磁盘层；值为 uint8 HWC numpy 数组。"""
+    def __init__(self, memory_bytes, disk=None):
+        self.memory_bytes = memory_bytes
+        self.disk = disk
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()
+        self.used = 0
+
+    def get(self, key):
+        with self.lock:
+            arr = self.entries.get(key)
+            if arr is not None:
+                self.entries.move_to_end(key)
+                profile_count("thumb_hits")
+                return arr
+        if self.disk is not None:
+            arr = self.disk.get(key)
+            if arr is not None:
+                # 缩略图很小，直接读入内存，避免大量 mmap 句柄
+                arr = np.array(arr)
+                self._remember(key, arr)
+                profile_count("thumb_hits")
+                return arr
+        profile_count("thumb_misses")
+        return None
+
+    def put(self, key, arr):
+        # 复制一份：调用方传入的常是整批缓冲区的视图，不能让缓存把整批留在内存里
+        arr = np.array(arr, copy=True)
+        self._remember(key, arr)
+        if self.disk is not None: self.disk.put(key, arr)
+
+    def _remember(self, key, arr):
+        with self.lock:
+            old = self.entries.pop(key, None)
+            if old is not None: self.used -= old.nbytes
+            self.entries[key] = arr
+            self.used += arr.nbytes
+            while self.used > self.memory_bytes and self.entries:
+                _, evicted = self.entries.popitem(last=False)
+                self.used -= evicted.nbytes
+
+_THUMB_CACHE = None
+_THUMB_CACHE_LOCK = threading.Lock()
+
+def get_thumbnail_cache():
+    global _THUMB_CACHE
+    if _THUMB_CACHE is not None: return _THUMB_CACHE
+    with _THUMB_CACHE_LOCK:
+        if _THUMB_CACHE is None:
+            _THUMB_CACHE = ThumbnailCache(THUMB_MEMORY_BYTES, disk_cache_from_env(THUMB_CACHE_ENV, THUMB_CACHE_MB_ENV, "thumbs", 1024))
+    return _THUMB_CACHE
+
+def content_digest(arr):
+    """像素内容哈希 (numpy / CPU 张量均可)，连同形状和类型一起作为 key 的一部分。"""
+    if hasattr(arr, "numpy"): arr = arr.detach().cpu().contiguous().numpy()
+    arr = np.ascontiguousarray(arr)
+    return (hashlib.sha1(memoryview(arr).cast("B")).hexdigest(), arr.shape, str(arr.dtype))
+
+def thumb_key(method, source, box):
+    """method: 缩放方式 (如 "file")；source: 文件的 frame_key (可附带 tar 成员名)；box: 目标尺寸上限。"""
+    return ("thumb", method, source, tuple(box))
@@ -1,10 +1,186 @@
 import os
 import json
-import numpy as np
 from PIL import Image
 from PIL.PngImagePlugin import PngInfo
 import folder_paths
 import torch
+import io
+import hashlib
+import tarfile
+import time
+import atexit
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from .dataset_shards import write_tar_shard, write_manifest, read_tar_member, next_counter, read_export_state, update_export_state, MANIFEST_SUFFIX, EXPORT_STATE_SUFFIX
+from .image_utils import tensor_to_uint8
+from .matrix_cache import content_digest
+from .matrix_profiler import profiled, phase, count as profile_count
+
+# ========================================================
+# 后台写盘：有界线程池 + 计数器预留
+# ========================================================
+
+ASYNC_WORKERS = min(4, os.cpu_count() or 1)
+# 同时排队的图片上限，超出时执行线程会等待，内存占用有上界
+ASYNC_MAX_PENDING = 32
+
+_EXECUTOR = None
+_PENDING = set()
+_PENDING_LOCK = threading.Lock()
+_PENDING_SLOTS = threading.BoundedSemaphore(ASYNC_MAX_PENDING)
+# Async 模式：(输出目录, 文件名) -> [下一个可用 counter, 尚未落盘的批次数]。
+# 后台任务尚未落盘时，get_save_image_path 看不到这些文件；全部落盘后删除条目
+_RESERVED_COUNTERS = {}
+
+def _get_executor():
+    global _EXECUTOR
+    if _EXECUTOR is None:
+        _EXECUTOR = ThreadPoolExecutor(max_workers=ASYNC_WORKERS, thread_name_prefix="MatrixDatasetWriter")
+    return _EXECUTOR
+
+def _on_write_done(future):
+    with _PENDING_LOCK: _PENDING.discard(future)
+    _PENDING_SLOTS.release()
+    error = future.exception()
+    if error is not None:
+        print(f"MatrixDatasetSaver Error: {error}")
+
+def submit_write(fn, *args, **kwargs):
+    _PENDING_SLOTS.acquire()
+    future = _get_executor().submit(fn, *args, **kwargs)
+    with _PENDING_LOCK: _PENDING.add(future)
+    future.add_done_callback(_on_write_done)
+    return future
+
+def flush_pending_writes():
+    """屏障：等待所有已提交的后台写盘任务完成。"""
+    while True:
+        with _PENDING_LOCK: pending = list(_PENDING)
+        if not pending: return
+        for future in pending:
+            try: future.result()
+            except Exception: pass
+
+atexit.register(flush_pending_writes)
+
+def reserve_counter(full_output_folder, filename, counter, n):
+    """预留 n 个 counter，返回 (起始 counter, key)；本批写盘结束后用 release_counter 释放。"""
+    key = (os.path.normcase(os.path.abspath(full_output_folder)), filename)
+    with _PENDING_LOCK:
+        entry = _RESERVED_COUNTERS.setdefault(key, [0, 0])
+        counter = max(counter, entry[0])
+        entry[0] = counter + n
+        entry[1] += 1
+    return counter, key
+
+def reserved_counter(full_output_folder, filename, counter):
+    """Sync 模式：不预留，但要跳过仍在后台写盘的 Async 批次已预留的 counter。"""
+    key = (os.path.normcase(os.path.abspath(full_output_folder)), filename)
+    with _PENDING_LOCK:
+        entry = _RESERVED_COUNTERS.get(key)
+        return max(counter, entry[0]) if entry is not None else counter
+
+def release_counter(key, futures=()):
+    """futures 全部结束后释放预留；没有其他未落盘的批次时删除条目，之后由 get_save_image_path 直接看到文件。"""
+    futures = list(futures)
+    left = [len(futures) + 1]
+    def done(_=None):
+        with _PENDING_LOCK:
+            left[0] -= 1
+            if left[0]: return
+            entry = _RESERVED_COUNTERS.get(key)
+            if entry is None: return
+            entry[1] -= 1
+            if entry[1] <= 0: del _RESERVED_COUNTERS[key]
+    for future in futures: future.add_done_callback(done)
+    done()
+
+def encode_image(img, fp, format="png", quality=95, metadata=None, compress_level=4, optimize=True):
+    # fp 可以是路径或 BytesIO (写入 tar 分片时)
+    if format == "png":
+        img.save(fp, format="PNG", pnginfo=metadata, compress_level=compress_level)
+    elif format == "jpg":
+        if img.mode == 'RGBA': img = img.convert('RGB')
+        img.save(fp, format="JPEG", quality=quality, optimize=optimize)
+    elif format == "webp":
+        img.save(fp, format="WEBP", quality=quality, lossless=False)
+
+def write_caption(txt_path, text):
+    data = text.encode('utf-8')
+    with open(txt_path, 'wb') as f:
+        f.write(data)
+    return len(data)
+
+def write_item(img, img_path, txt_path, text, **encode_opts):
+    """编码并写入一张图片 (及其 caption)，返回写入的字节数。"""
+    encode_image(img, img_path, **encode_opts)
+    written = os.path.getsize(img_path)
+    # txt_path 为 None 时 caption 另存 (JSONL 清单)
+    if txt_path is not None:
+        written += write_caption(txt_path, text)
+    return written
+
+# ========================================================
+# 增量导出：每个槽位记录 图片像素 / caption / 编码参数 的哈希
+# ========================================================
+
+def image_digest(image_u8):
+    digest, shape, _ = content_digest(image_u8)
+    return f"{digest}-{'x'.join(str(d) for d in shape)}"
+
+def caption_digest(text):
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()
+
+def commit_export_state(path, slots, pending):
+    """
+    slots: 本批次的槽位；pending: [(槽位名, future)]。
+    写入失败的槽位从状态中删除，下次重跑时会重写；其他批次的槽位原样保留。
+    """
+    dropped = {stem for stem, future in pending if future.exception() is not None}
+    update_export_state(path, {k: v for k, v in slots.items() if k not in dropped}, dropped)
+    return 0
+
+def _encode_to_bytes(img, encode_opts):
+    # 增量模式下未变化的图片直接复用旧分片中已编码的字节
+    if isinstance(img, bytes): return img
+    buf = io.BytesIO()
+    encode_image(img, buf, **encode_opts)
+    return buf.getvalue()
+
+def write_shard(samples, shard_path, threads=1, **encode_opts):
+    # samples: [(key, PIL 图片, caption)]，并行编码到内存后一次写成一个 tar
+    imgs = [img for _, img, _ in samples]
+    if threads > 1:
+        with ThreadPoolExecutor(max_workers=threads) as pool:
+            payloads = list(pool.map(lambda img: _encode_to_bytes(img, encode_opts), imgs))
+    else:
+        payloads = [_encode_to_bytes(img, encode_opts) for img in imgs]
+    fmt = encode_opts.get("format", "png")
+    write_tar_shard(shard_path, [(key, fmt, data, caption) for (key, _, caption), data in zip(samples, payloads)])
+    return os.path.getsize(shard_path)
+
+def format_throughput(n_images, n_bytes, seconds):
+    mb = n_bytes / (1024 * 1024)
+    rate = mb / seconds if seconds > 0 else 0.0
+    return f"Saved {n_images} images · {mb:.1f} MB in {seconds:.2f}s · {rate:.1f} MB/s"
+
+def split_captions(text, caption_mode, count):
+    """按 caption_mode 把 text 拆成与图片批次对齐的 caption 列表。"""
+    if caption_mode == "Per Line":
+        captions = [line.strip() for line in text.splitlines() if line.strip()]
+    elif caption_mode == "JSON List":
+        try:
+            captions = [str(t) for t in json.loads(text)]
+        except (ValueError, TypeError) as e:
+            print(f"MatrixDatasetSaver Error: invalid JSON caption list ({e}), using shared text")
+            captions = [text]
+    else:
+        return [text] * count
+    if len(captions) != count:
+        print(f"MatrixDatasetSaver Warning: {len(captions)} captions for {count} images")
+    if len(captions) < count:
+        captions += [""] * (count - len(captions))
+    return captions[:count]
 
 class MatrixDatasetSaver:
     """
@@ -21,6 +197,13 @@ class MatrixDatasetSaver:
     1. 格式自由：支持 PNG (无损), JPG (小体积), WebP。
     2. 自动同步：输入的 text 会被写入同名 .txt 文件。
     3. 训练就绪：配合 Text Extractor 使用，可直接把提取的 Prompt 存为训练 Tag。
+    4. 后台写盘：save_mode=Async 时编码与写盘交给后台线程池，节点立即返回。
+       Sync 模式下同一批图片也会多线程并行编码 (PIL 编码时释放 GIL)，节点界面显示写入 MB/s。
+    5. 逐图 Caption：caption_mode=Per Line / JSON List 时，每张图使用自己的 caption。
+    6. 分片输出：Tar Shard (WebDataset 风格，每批一个 .tar) / JSONL Manifest (caption 汇总到一个清单)，
+       避免十万级训练集变成几十万个小文件。Folder Iterator 可直接读回 (Index / Direct 加载器不读取 .tar 分片内的图片)。
+    7. 增量导出：incremental=True 时第 N 张固定写入同一个槽位 (前缀_0000N_)，并在输出目录记录每个槽位的内容哈希。
+       重跑时图片和 caption 都没变的直接跳过，只改了 caption 的只重写 txt，不重新编码图片。
     """
     
     def __init__(self):
@@ -38,6 +221,18 @@ class MatrixDatasetSaver:
                 "format": (["png", "jpg", "webp"], {"default": "png", "tooltip": "保存格式"}),
                 "quality": ("INT", {"default": 95, "min": 1, "max": 100, "tooltip": "JPG/WebP 的压缩质量 (100为最高)"}),
             },
+            "optional": {
+                "caption_mode": (["Shared", "Per Line", "JSON List"], {"default": "Shared", "tooltip": "Shared=所有图片同一段文本；Per Line=每行对应一张图；JSON List=JSON 字符串数组"}),
+                "output_layout": (["Files", "Tar Shard", "JSONL Manifest"], {"default": "Files", "tooltip": "Files=图片+同名txt；Tar Shard=每批一个 WebDataset 风格 .tar (用 Folder Iterator 读回，Index / Direct 加载器不读分片)；JSONL Manifest=图片文件 + 每批一个 caption 清单"}),
+                "metadata_mode": (["Embed", "Sidecar JSON", "None"], {"default": "Embed", "tooltip": "工作流元数据：Embed=写入每张 PNG；Sidecar JSON=每批只写一个 _workflow.json；None=不保存"}),
+                "png_compress_level": ("INT", {"default": 4, "min": 0, "max": 9, "tooltip": "PNG zlib 压缩级别 (0=不压缩最快，9=最小最慢)"}),
+                "jpg_optimize": ("BOOLEAN", {"default": True, "tooltip": "JPG 额外做一遍 Huffman 优化 (体积略小，编码更慢)"}),
+                "encode_threads": ("INT", {"default": 1, "min": 0, "max": 64, "tooltip": "并行编码线程数 (1=单线程，与旧版本行为一致；0=自动按 CPU 核数)"}),
+                "save_mode": (["Sync", "Async"], {"default": "Sync", "tooltip": "Sync=逐张编码写盘后返回；Async=交给后台线程池，立即返回"}),
+                "wait_for_pending": ("BOOLEAN", {"default": False, "tooltip": "返回前等待所有后台写盘完成 (屏障)"}),
+                "incremental": ("BOOLEAN", {"default": False, "tooltip": "增量导出：固定槽位命名 + 内容哈希清单，重跑时只写有变化的图片 / caption"}),
+                "slot_offset": ("INT", {"default": 0, "min": 0, "max": 99999, "tooltip": "增量模式下本批第一张的槽位偏移 (逐张排队保存时可接序号)"}),
+            },
             "hidden": {"prompt": "PROMPT", "extra_pnginfo": "EXTRA_PNGINFO"},
         }
 
@@ -46,47 +241,191 @@ class MatrixDatasetSaver:
     OUTPUT_NODE = True
     CATEGORY = "Custom/Matrix"
 
-    def save_dataset(self, images, text, filename_prefix="train_data/img", format="png", quality=95, prompt=None, extra_pnginfo=None):
+    @profiled
+    def save_dataset(self, images, text, filename_prefix="train_data/img", format="png", quality=95, caption_mode="Shared", output_layout="Files", metadata_mode="Embed", png_compress_level=4, jpg_optimize=True, encode_threads=1, save_mode="Sync", wait_for_pending=False, incremental=False, slot_offset=0, prompt=None, extra_pnginfo=None):
+        start_time = time.perf_counter()
         filename_prefix += self.prefix_append
         full_output_folder, filename, counter, subfolder, filename_prefix = folder_paths.get_save_image_path(filename_prefix, self.output_dir, images[0].shape[1], images[0].shape[0])
+        reservation = None
+        if incremental:
+            # 确定性命名：重跑时覆盖同一槽位，而不是顺延 counter
+            counter = slot_offset + 1
+            state_path = os.path.join(full_output_folder, f"{filename}{EXPORT_STATE_SUFFIX}")
+            old_state = read_export_state(state_path)
+            # 只记录本批次的槽位，提交时合并进文件的最新内容
+            batch_state = {}
+            options = f"{format}:{quality}:{png_compress_level}:{int(bool(jpg_optimize))}"
+            state_pending = []
+            skipped = captions_only = 0
+        else:
+            if output_layout != "Files":
+                # 分片里的图片不在目录中，get_save_image_path 只看到每个分片的起始编号
+                counter = next_counter(full_output_folder, filename, counter)
+            if save_mode == "Async":
+                counter, reservation = reserve_counter(full_output_folder, filename, counter, len(images))
+            else:
+                # Sync 模式返回前文件已经落盘，不需要预留；但不能占用 Async 批次尚未落盘的 counter
+                counter = reserved_counter(full_output_folder, filename, counter)
         results = list()
+
+        # 工作流 JSON 往往有几百 KB 且整批相同：每次调用只序列化一次
+        metadata = None
+        if metadata_mode == "Embed" and format == "png":
+            metadata = PngInfo()
+            if prompt is not None:
+                metadata.add_text("prompt", json.dumps(prompt))
+            if extra_pnginfo is not None:
+                for x in extra_pnginfo:
+                    metadata.add_text(x, json.dumps(extra_pnginfo[x]))
+        elif metadata_mode == "Sidecar JSON" and (prompt is not None or extra_pnginfo is not None):
+            sidecar = {}
+            if prompt is not None: sidecar["prompt"] = prompt
+            if extra_pnginfo is not None: sidecar.update(extra_pnginfo)
+            with open(os.path.join(full_output_folder, f"{filename}_{counter:05}_workflow.json"), 'w', encoding='utf-8') as f:
+                json.dump(sidecar, f)
+
+        encode_opts = {"format": format, "quality": quality, "metadata": metadata, "compress_level": png_compress_level, "optimize": jpg_optimize}
+        threads = encode_threads if encode_threads > 0 else (os.cpu_count() or 1)
+        threads = max(1, min(threads, len(images)))
+        # Sync 模式用本次调用的线程池并行编码；Async 模式交给全局后台线程池
+        local_pool = ThreadPoolExecutor(max_workers=threads) if save_mode != "Async" and threads > 1 else None
+        futures = []
+        written = 0
+
+        def dispatch(fn, *args, **kwargs):
+            nonlocal written
+            if save_mode == "Async":
+                futures.append(submit_write(fn, *args, **kwargs))
+            elif local_pool is not None:
+                futures.append(local_pool.submit(fn, *args, **kwargs))
+            else:
+                written += fn(*args, **kwargs)
+                return None
+            return futures[-1]
+        
+        captions = split_captions(text, caption_mode, len(images))
+        first_counter = counter
+        shard_samples = []
+        manifest_entries = []
         
-        for image in images:
-            i = 255. * image.cpu().numpy()
-            img = Image.fromarray(np.clip(i, 0, 255).astype(np.uint8))
-            file_stem = f"{filename}_{counter:05}_"
-            
-            if format == "png":
-                metadata = PngInfo()
-                if prompt is not None:
-                    metadata.add_text("prompt", json.dumps(prompt))
-                if extra_pnginfo is not None:
-                    for x in extra_pnginfo:
-                        metadata.add_text(x, json.dumps(extra_pnginfo[x]))
-                img_filename = f"{file_stem}.png"
-                img.save(os.path.join(full_output_folder, img_filename), pnginfo=metadata, compress_level=4)
-                
-            elif format == "jpg":
-                img_filename = f"{file_stem}.jpg"
-                if img.mode == 'RGBA': img = img.convert('RGB')
-                img.save(os.path.join(full_output_folder, img_filename), quality=quality, optimize=True)
-                
-            elif format == "webp":
-                img_filename = f"{file_stem}.webp"
-                img.save(os.path.join(full_output_folder, img_filename), quality=quality, lossless=False)
-
-            txt_filename = f"{file_stem}.txt"
-            with open(os.path.join(full_output_folder, txt_filename), 'w', encoding='utf-8') as f:
-                f.write(text)
-
-            results.append({
-                "filename": img_filename,
-                "subfolder": subfolder,
-                "type": self.type
-            })
-            counter += 1
-
-        return {"ui": {"images": results}}
+        # 整批一次性转为 uint8 (chunk 内原地 clamp/scale/cast)，逐张取零拷贝视图
+        with phase("convert"):
+            batch_u8 = tensor_to_uint8(images)
+
+        shard_name = f"{filename}_{first_counter:05}_.tar"
+        shard_path = os.path.join(full_output_folder, shard_name)
+        shard_exists = incremental and os.path.exists(shard_path)
+        shard_dirty = not shard_exists
+        manifest_path = os.path.join(full_output_folder, f"{filename}_{first_counter:05}{MANIFEST_SUFFIX}")
+        manifest_dirty = not incremental or not os.path.exists(manifest_path)
+
+        try:
+            for image, caption in zip(batch_u8, captions):
+                file_stem = f"{filename}_{counter:05}_"
+                img_filename = f"{file_stem}.{format}"
+                img_path = os.path.join(full_output_folder, img_filename)
+                txt_path = os.path.join(full_output_folder, f"{file_stem}.txt")
+                if output_layout == "JSONL Manifest": txt_path = None
+
+                image_same = caption_same = False
+                if incremental:
+                    with phase("hash"):
+                        entry = {"image": image_digest(image), "caption": caption_digest(caption), "options": options}
+                    old = old_state.get(file_stem)
+                    if old is not None:
+                        image_same = old.get("image") == entry["image"] and old.get("options") == options
+                        caption_same = old.get("caption") == entry["caption"]
+                    batch_state[file_stem] = entry
+                    if output_layout != "Tar Shard":
+                        # 文件被手动删掉的槽位也要重写
+                        image_same = image_same and os.path.exists(img_path)
+                        caption_same = caption_same and (txt_path is None or os.path.exists(txt_path))
+
+                if output_layout == "Tar Shard":
+                    shard_dirty = shard_dirty or not (image_same and caption_same)
+                    if image_same and shard_exists:
+                        if caption_same: skipped += 1
+                        else: captions_only += 1
+                    # WebDataset 的 key 取第一个 "." 之前的部分，这里不带扩展名
+                    # 旧分片存在时才复用其中的编码字节 (分片被删除或刚从 Files 切换过来时全部重新编码)
+                    shard_samples.append((file_stem, (image, img_filename if image_same and shard_exists else None), caption))
+                    counter += 1
+                    continue
+
+                if output_layout == "JSONL Manifest":
+                    manifest_entries.append((img_filename, caption))
+                    manifest_dirty = manifest_dirty or not caption_same
+
+                if image_same and caption_same:
+                    skipped += 1
+                elif image_same:
+                    # 只改了 caption：JSONL 清单整体重写即可，Files 只重写 txt
+                    captions_only += 1
+                    if txt_path is not None:
+                        future = dispatch(write_caption, txt_path, caption)
+                        if future is not None: state_pending.append((file_stem, future))
+                else:
+                    future = dispatch(write_item, Image.fromarray(image), img_path, txt_path, caption, **encode_opts)
+                    if incremental and future is not None: state_pending.append((file_stem, future))
+
+                results.append({
+                    "filename": img_filename,
+                    "subfolder": subfolder,
+                    "type": self.type
+                })
+                counter += 1
+
+            if shard_samples and shard_dirty:
+                samples = []
+                for key, (image, reuse_name), caption in shard_samples:
+                    # 图片没变时复用旧分片里的编码字节，分片重写也不必重新编码
+                    payload = None
+                    if reuse_name is not None:
+                        try:
+                            payload = read_tar_member(shard_path, reuse_name)
+                        except (OSError, tarfile.TarError):
+                            payload = None
+                    samples.append((key, payload if payload is not None else Image.fromarray(image), caption))
+                shard_samples = samples
+                if save_mode == "Async":
+                    future = dispatch(write_shard, shard_samples, shard_path, threads, **encode_opts)
+                    if incremental: state_pending += [(key, future) for key, _, _ in shard_samples]
+                else:
+                    written += write_shard(shard_samples, shard_path, threads, **encode_opts)
+            if manifest_entries and manifest_dirty:
+                write_manifest(manifest_path, manifest_entries)
+
+            if local_pool is not None:
+                written += sum(f.result() for f in futures)
+        finally:
+            if local_pool is not None: local_pool.shutdown(wait=True)
+            if reservation is not None: release_counter(reservation, futures)
+
+        if incremental and any(old_state.get(k) != v for k, v in batch_state.items()):
+            if save_mode == "Async":
+                # 排在本批写盘任务之后，只记录成功落盘的槽位
+                submit_write(commit_export_state, state_path, batch_state, state_pending)
+            else:
+                commit_export_state(state_path, batch_state, state_pending)
+
+        if wait_for_pending:
+            with phase("flush"):
+                flush_pending_writes()
+        profile_count("images", len(images))
+        if save_mode == "Async" and not wait_for_pending:
+            # 文件可能尚未落盘，不返回图片预览，避免界面读取到半成品
+            return {"ui": {"text": [f"Queued {len(images)} images for background saving"]}}
+
+        if save_mode == "Async":
+            written += sum(f.result() for f in futures if f.exception() is None)
+        profile_count("bytes_written", written)
+        stats = format_throughput(len(images), written, time.perf_counter() - start_time)
+        if incremental:
+            profile_count("skipped", skipped)
+            stats += f" · {skipped} unchanged skipped · {captions_only} captions rewritten"
+        if shard_samples:
+            return {"ui": {"text": [f"{stats} → {os.path.join(subfolder, shard_name)}"]}}
+        return {"ui": {"images": results, "text": [stats]}}
 
 NODE_CLASS_MAPPINGS = {
     "MatrixDatasetSaver": MatrixDatasetSaver
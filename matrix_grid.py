@@ -1,23 +1,136 @@
 # -*- coding: utf-8 -*-
 import torch
+import torch.nn.functional as F
 import numpy as np
-from PIL import Image, ImageDraw, ImageFont
+from PIL import Image, ImageDraw, ImageFont, ImageOps
 import math
+import os
+import io
+from .image_utils import tensor_to_uint8, to_float_image
+from .matrix_profiler import profiled, phase
+from . import asset_resolver
+from .matrix_cache import get_thumbnail_cache, thumb_key, frame_key
+from .dataset_shards import is_shard_member, split_shard_member, read_tar_member
+
+# 网格背景色 / 标签文字颜色
+BG_COLOR = (20, 20, 20)
+LABEL_COLOR = (200, 200, 200)
+
+_FONT = None
+# 标签缓存：(文字, 单元宽, 标签高) -> float 张量 (text_h, cell_w, 3)，只渲染一次
+_LABEL_CACHE = {}
+_LABEL_CACHE_MAX = 4096
+
+def get_font():
+    global _FONT
+    if _FONT is None:
+        try: _FONT = ImageFont.truetype("arial.ttf", 20)
+        except: _FONT = ImageFont.load_default()
+    return _FONT
+
+def get_label_tile(label, cell_w, text_h):
+    key = (label, cell_w, text_h)
+    tile = _LABEL_CACHE.get(key)
+    if tile is None:
+        img = Image.new('RGB', (cell_w, text_h), color=BG_COLOR)
+        draw = ImageDraw.Draw(img)
+        text_w = len(label) * 10
+        draw.text(((cell_w - text_w) // 2, 5), label, fill=LABEL_COLOR, font=get_font())
+        tile = torch.from_numpy(np.array(img).astype(np.float32) / 255.0)
+        if len(_LABEL_CACHE) >= _LABEL_CACHE_MAX: _LABEL_CACHE.clear()
+        _LABEL_CACHE[key] = tile
+    return tile
+
+def fit_size(h, w, max_h, max_w):
+    # 与 PIL thumbnail 一致：保持比例缩小到框内，不放大
+    scale = min(max_w / w, max_h / h, 1.0)
+    return max(1, round(h * scale)), max(1, round(w * scale))
 
 class BaseMatrixAssetGrid:
-    def create_grid_common(self, thumbnail_size, columns, add_labels, count, **kwargs):
-        valid_images = []
+    @profiled
+    def create_grid_common(self, thumbnail_size, columns, add_labels, count, backend="PIL", **kwargs):
+        entries = []
         for i in range(1, count + 1):
             key = f"img_{i}"
             img_tensor = kwargs.get(key)
             if img_tensor is not None:
-                t = img_tensor[0].cpu().numpy()
-                pil_img = Image.fromarray(np.clip(255. * t, 0, 255).astype(np.uint8))
-                valid_images.append((i, pil_img))
+                entries.append((i, img_tensor[0]))
 
-        if not valid_images:
+        if not entries:
             return (torch.zeros((1, 512, 512, 3)), )
 
+        with phase("composite"):
+            if backend == "PIL":
+                return (self.create_grid_pil(entries, thumbnail_size, columns, add_labels),)
+            return (self.create_grid_tensor(entries, thumbnail_size, columns, add_labels),)
+
+    def new_canvas(self, n, thumbnail_size, columns, add_labels):
+        rows = math.ceil(n / columns)
+        text_h = 30 if add_labels else 0
+        grid = torch.empty((rows * (thumbnail_size + text_h), columns * thumbnail_size, 3), dtype=torch.float32)
+        grid[:] = torch.tensor(BG_COLOR, dtype=torch.float32) / 255.0
+        return grid, text_h
+
+    def paste_thumb(self, grid, idx, thumb, thumbnail_size, columns, text_h):
+        """thumb: 已缩放好的 uint8 (th, tw, 3)，居中写入第 idx 格。"""
+        th, tw = thumb.shape[:2]
+        r, c = divmod(idx, columns)
+        x0 = c * thumbnail_size + (thumbnail_size - tw) // 2
+        y0 = r * (thumbnail_size + text_h) + (thumbnail_size - th) // 2 + text_h
+        grid[y0:y0 + th, x0:x0 + tw] = torch.from_numpy(thumb).float().div_(255.0)
+
+    def paste_cells(self, grid, indices, batch, thumbnail_size, columns, text_h):
+        """
+        batch: 同尺寸的一批图片 (n, h, w, c)，缩放后按切片写入 grid 中 indices 对应的格子。
+        不查缩略图缓存：对全尺寸像素算内容哈希比直接合批缩放还慢。
+        """
+        box = (thumbnail_size - 10, thumbnail_size - 10)
+        _, h, w, _ = batch.shape
+        th, tw = fit_size(h, w, box[1], box[0])
+        batch = to_float_image(batch.cpu())
+        if batch.shape[-1] == 1: batch = batch.expand(-1, -1, -1, 3)
+        batch = batch[..., :3].permute(0, 3, 1, 2)
+        if (th, tw) != (h, w):
+            batch = F.interpolate(batch, size=(th, tw), mode="bilinear", align_corners=False, antialias=True)
+        # 量化为 uint8 再贴，与文件夹模式的缩略图一致
+        thumbs = tensor_to_uint8(batch.clamp(0, 1).permute(0, 2, 3, 1))
+        for k, idx in enumerate(indices):
+            self.paste_thumb(grid, idx, thumbs[k], thumbnail_size, columns, text_h)
+
+    def paste_label(self, grid, idx, label, thumbnail_size, columns, text_h):
+        r, c = divmod(idx, columns)
+        y0 = r * (thumbnail_size + text_h)
+        grid[y0:y0 + text_h, c * thumbnail_size:(c + 1) * thumbnail_size] = get_label_tile(label, thumbnail_size, text_h)
+
+    def create_grid_tensor(self, entries, thumbnail_size, columns, add_labels):
+        """
+        张量直出：同尺寸输入合并为一批 interpolate，按切片写入预分配的画布，不经过 PIL。
+        """
+        grid, text_h = self.new_canvas(len(entries), thumbnail_size, columns, add_labels)
+
+        groups = {}
+        for idx, (_, t) in enumerate(entries):
+            # 加载器可能输出不同精度 (fp32 / fp16 / uint8)，按尺寸 + 精度分组后再合批
+            groups.setdefault((tuple(t.shape), t.dtype), []).append(idx)
+
+        for idxs in groups.values():
+            batch = torch.stack([entries[i][1] for i in idxs])
+            self.paste_cells(grid, idxs, batch, thumbnail_size, columns, text_h)
+
+        if add_labels:
+            for idx, (original_idx, _) in enumerate(entries):
+                self.paste_label(grid, idx, f"Img {original_idx}", thumbnail_size, columns, text_h)
+
+        return grid.unsqueeze(0)
+
+    def create_grid_pil(self, entries, thumbnail_size, columns, add_labels):
+        box = (thumbnail_size - 10, thumbnail_size - 10)
+        valid_images = []
+        for original_idx, t in entries:
+            pil_img = Image.fromarray(tensor_to_uint8(t[None])[0])
+            pil_img.thumbnail(box)
+            valid_images.append((original_idx, pil_img))
+
         rows = math.ceil(len(valid_images) / columns)
         cell_w = thumbnail_size
         cell_h = thumbnail_size
@@ -26,11 +139,9 @@ class BaseMatrixAssetGrid:
         grid_w = columns * cell_w
         grid_h = rows * (cell_h + text_h)
         
-        grid_img = Image.new('RGB', (grid_w, grid_h), color=(20, 20, 20))
+        grid_img = Image.new('RGB', (grid_w, grid_h), color=BG_COLOR)
         draw = ImageDraw.Draw(grid_img)
-        
-        try: font = ImageFont.truetype("arial.ttf", 20)
-        except: font = ImageFont.load_default()
+        font = get_font()
 
         for idx, (original_idx, pil_img) in enumerate(valid_images):
             r = idx // columns
@@ -38,7 +149,6 @@ class BaseMatrixAssetGrid:
             x_offset = c * cell_w
             y_offset = r * (cell_h + text_h)
             
-            pil_img.thumbnail((cell_w - 10, cell_h - 10))
             paste_x = x_offset + (cell_w - pil_img.width) // 2
             paste_y = y_offset + (cell_h - pil_img.height) // 2 + text_h
             
@@ -48,10 +158,9 @@ class BaseMatrixAssetGrid:
                 label = f"Img {original_idx}"
                 text_w = len(label) * 10 
                 text_x = x_offset + (cell_w - text_w) // 2
-                draw.text((text_x, y_offset + 5), label, fill=(200, 200, 200), font=font)
+                draw.text((text_x, y_offset + 5), label, fill=LABEL_COLOR, font=font)
 
-        output_tensor = torch.from_numpy(np.array(grid_img).astype(np.float32) / 255.0).unsqueeze(0)
-        return (output_tensor,)
+        return torch.from_numpy(np.array(grid_img).astype(np.float32) / 255.0).unsqueeze(0)
 
 class MatrixAssetGrid5(BaseMatrixAssetGrid):
     """5图版拼图"""
@@ -74,6 +183,7 @@ class MatrixAssetGrid5(BaseMatrixAssetGrid):
                 "add_labels": ("BOOLEAN", {"default": True, "tooltip": "显示图片编号"}),
             },
             "optional": {
+                "backend": (["PIL", "Tensor"], {"default": "PIL", "tooltip": "拼图方式：PIL=逐张 thumbnail 粘贴 (默认，与旧版本输出一致)；Tensor=张量直出 (批量缩放，无 PIL 往返，缩放算法不同，像素与 PIL 略有差异)"}),
                 "img_1": ("IMAGE", ), "img_2": ("IMAGE", ), "img_3": ("IMAGE", ), 
                 "img_4": ("IMAGE", ), "img_5": ("IMAGE", ),
             }
@@ -82,8 +192,8 @@ class MatrixAssetGrid5(BaseMatrixAssetGrid):
     RETURN_NAMES = ("Grid",)
     FUNCTION = "create_grid"
     CATEGORY = "Custom/Matrix"
-    def create_grid(self, thumbnail_size, columns, add_labels, **kwargs):
-        return self.create_grid_common(thumbnail_size, columns, add_labels, 5, **kwargs)
+    def create_grid(self, thumbnail_size, columns, add_labels, backend="PIL", **kwargs):
+        return self.create_grid_common(thumbnail_size, columns, add_labels, 5, backend, **kwargs)
 
 class MatrixAssetGrid10(BaseMatrixAssetGrid):
     """10图版拼图"""
@@ -103,6 +213,7 @@ class MatrixAssetGrid10(BaseMatrixAssetGrid):
                 "add_labels": ("BOOLEAN", {"default": True}),
             },
             "optional": {
+                "backend": (["PIL", "Tensor"], {"default": "PIL", "tooltip": "拼图方式：PIL=逐张 thumbnail 粘贴 (默认，与旧版本输出一致)；Tensor=张量直出 (批量缩放，像素与 PIL 略有差异)"}),
                 "img_1": ("IMAGE", ), "img_2": ("IMAGE", ), "img_3": ("IMAGE", ), "img_4": ("IMAGE", ), "img_5": ("IMAGE", ),
                 "img_6": ("IMAGE", ), "img_7": ("IMAGE", ), "img_8": ("IMAGE", ), "img_9": ("IMAGE", ), "img_10": ("IMAGE", ),
             }
@@ -111,15 +222,132 @@ class MatrixAssetGrid10(BaseMatrixAssetGrid):
     RETURN_NAMES = ("Grid",)
     FUNCTION = "create_grid"
     CATEGORY = "Custom/Matrix"
-    def create_grid(self, thumbnail_size, columns, add_labels, **kwargs):
-        return self.create_grid_common(thumbnail_size, columns, add_labels, 10, **kwargs)
+    def create_grid(self, thumbnail_size, columns, add_labels, backend="PIL", **kwargs):
+        return self.create_grid_common(thumbnail_size, columns, add_labels, 10, backend, **kwargs)
+
+class MatrixContactSheet(BaseMatrixAssetGrid):
+    """整批 / 整个文件夹拼图"""
+    
+    DESCRIPTION = """
+    【矩阵-联系表 (整批/文件夹)】
+    功能：把一个 IMAGE 批次的每一帧，或文件夹里的每一张图，拼成一张联系表，用于 QA 抽查。
+    特点：
+    1. 流式缩略：按小批次缩放后直接写入画布，上千帧也不会同时持有全尺寸图片。
+    2. 文件夹模式：逐张解码 (JPEG 直接按缩略尺寸解码)，用完即释放。
+    3. 两者都接入时，先排批次帧，再排文件夹图片。
+    """
+    
+    # 每次缩放的帧数，决定全尺寸中间数据的峰值
+    CHUNK_FRAMES = 16
+    
+    @classmethod
+    def INPUT_TYPES(s):
+        return {
+            "required": {
+                "thumbnail_size": ("INT", {"default": 128, "min": 32, "max": 1024, "tooltip": "缩略图大小"}),
+                "columns": ("INT", {"default": 10, "min": 1, "max": 100, "tooltip": "每行显示几张"}),
+                "add_labels": ("BOOLEAN", {"default": True, "tooltip": "显示帧号 / 文件名"}),
+                "max_frames": ("INT", {"default": 0, "min": 0, "max": 100000, "tooltip": "最多拼多少张 (0=全部)"}),
+            },
+            "optional": {
+                "images": ("IMAGE", {"tooltip": "整批图片，每一帧都会上图"}),
+                "folder_path": ("STRING", {"default": "", "multiline": False, "tooltip": "图片文件夹 (留空=不使用)"}),
+            }
+        }
+    RETURN_TYPES = ("IMAGE", "INT")
+    RETURN_NAMES = ("Grid", "Count")
+    FUNCTION = "create_sheet"
+    CATEGORY = "Custom/Matrix"
+
+    @classmethod
+    def IS_CHANGED(s, folder_path="", **kwargs):
+        # images 连线的变化由 ComfyUI 自己处理；文件夹模式按 文件列表 + 每个文件的 mtime/size 取指纹
+        # folder_path 连线时在 IS_CHANGED 中为 None，不知道读哪个文件夹，每次都重算
+        if folder_path is None: return float("nan")
+        if not folder_path: return ""
+        try:
+            catalog, files = asset_resolver.list_assets(folder_path)
+        except Exception:
+            return float("nan")
+        if catalog is None: return f"missing:{folder_path}"
+        return asset_resolver.fingerprint([len(files)] + [asset_resolver.signature(catalog, name) for name in files])
+
+    def list_folder(self, folder_path):
+        try:
+            return asset_resolver.list_assets(folder_path)[1]
+        except Exception as e:
+            print(f"MatrixContactSheet Error reading dir: {e}")
+            return []
+
+    def load_thumbnail(self, path, thumbnail_size):
+        """返回 uint8 (th, tw, 3)；按 路径 + mtime + 大小 查缩略图缓存，命中时完全不打开文件。
+        tar 分片成员 ("分片.tar/成员名") 按分片文件的状态 + 成员名作缓存键，从分片中读取字节。"""
+        box = (thumbnail_size - 10, thumbnail_size - 10)
+        cache = get_thumbnail_cache()
+        try:
+            member = None
+            if is_shard_member(path):
+                path, member = split_shard_member(path)
+            key = thumb_key("file", frame_key(path, os.stat(path)) + (member,), box)
+            thumb = cache.get(key)
+            if thumb is not None: return thumb
+            source = path
+            if member is not None:
+                data = read_tar_member(path, member)
+                if data is None: raise FileNotFoundError(f"{member} not in {path}")
+                source = io.BytesIO(data)
+            with Image.open(source) as img:
+                # JPEG 可直接按缩略尺寸解码，跳过全尺寸像素
+                img.draft("RGB", box)
+                img = ImageOps.exif_transpose(img).convert("RGB")
+                img.thumbnail(box)
+                thumb = np.asarray(img)
+            cache.put(key, thumb)
+            return thumb
+        except Exception as e:
+            print(f"MatrixContactSheet Error: {e}")
+            return None
+
+    @profiled
+    def create_sheet(self, thumbnail_size, columns, add_labels, max_frames, images=None, folder_path=""):
+        n_frames = images.shape[0] if images is not None else 0
+        with phase("scan"):
+            files = self.list_folder(folder_path) if folder_path else []
+        total = n_frames + len(files)
+        if max_frames > 0: total = min(total, max_frames)
+        if total == 0:
+            return (torch.zeros((1, 512, 512, 3)), 0)
+
+        grid, text_h = self.new_canvas(total, thumbnail_size, columns, add_labels)
+
+        n_frames = min(n_frames, total)
+        for start in range(0, n_frames, self.CHUNK_FRAMES):
+            end = min(start + self.CHUNK_FRAMES, n_frames)
+            self.paste_cells(grid, range(start, end), images[start:end], thumbnail_size, columns, text_h)
+            if add_labels:
+                for idx in range(start, end):
+                    self.paste_label(grid, idx, f"#{idx}", thumbnail_size, columns, text_h)
+
+        max_chars = max(1, thumbnail_size // 10)
+        for idx in range(n_frames, total):
+            name = files[idx - n_frames]
+            with phase("decode"):
+                thumb = self.load_thumbnail(os.path.join(folder_path, name), thumbnail_size)
+            if thumb is not None:
+                self.paste_thumb(grid, idx, thumb, thumbnail_size, columns, text_h)
+            if add_labels:
+                self.paste_label(grid, idx, os.path.splitext(name)[0][:max_chars], thumbnail_size, columns, text_h)
+
+        return (grid.unsqueeze(0), total)
 
 NODE_CLASS_MAPPINGS = {
     "MatrixAssetGrid5": MatrixAssetGrid5,
-    "MatrixAssetGrid10": MatrixAssetGrid10
+    "MatrixAssetGrid10": MatrixAssetGrid10,
+    "MatrixContactSheet": MatrixContactSheet
 }
 
 NODE_DISPLAY_NAME_MAPPINGS = {
     "MatrixAssetGrid5": "Matrix Asset Grid (5) | 矩阵-预览",
-    "MatrixAssetGrid10": "Matrix Asset Grid (10) | 矩阵-预览"
+    "MatrixAssetGrid10": "Matrix Asset Grid (10) | 矩阵-预览",
+    "MatrixContactSheet": "Matrix Contact Sheet | 矩阵-联系表"
 }
\ No newline at end of file
@@ -0,0 +1,165 @@
+# -*- coding: utf-8 -*-
+"""
+可选的性能剖析层 (默认关闭)。设置环境变量 MATRIX_NODES_PROFILE=1 开启。
+按节点、按阶段记录耗时与计数 (扫描文件数 / 缓存命中 / 写入字节 / 帧率 ...)：
+- 每次执行的结果随节点 UI 返回 (ui.matrix_profile)
+- 进程内累计结果写入输出目录下的 matrix_profile.json：最多每 DUMP_INTERVAL 秒写一次，
+  进程退出时补写最后一次；也可以直接调用 dump()
+"""
+import atexit
+import functools
+import json
+import os
+import tempfile
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+
+ENABLED = os.environ.get("MATRIX_NODES_PROFILE", "").lower() not in ("", "0", "false", "off")
+DUMP_FILENAME = "matrix_profile.json"
+# 两次写 matrix_profile.json 之间的最短间隔 (秒)
+DUMP_INTERVAL = 5.0
+
+_local = threading.local()
+_totals = {}
+_totals_lock = threading.Lock()
+_dump_lock = threading.Lock()   # 保证较新的快照不会被较旧的覆盖
+_last_dump = 0.0
+_dirty = False
+_NULL = nullcontext()
+
+class NodeProfile:
+    def __init__(self, node):
+        self.node = node
+        self.start = time.perf_counter()
+        self.phases = {}
+        self.counters = {}
+
+    @contextmanager
+    def phase(self, name):
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phases[name] = self.phases.get(name, 0.0) + (time.perf_counter() - t0)
+
+    def count(self, key, n=1):
+        self.counters[key] = self.counters.get(key, 0) + n
+
+    def set(self, key, value):
+        self.counters[key] = value
+
+    def summary(self):
+        return {
+            "node": self.node,
+            "total_ms": round((time.perf_counter() - self.start) * 1000, 3),
+            "phases_ms": {k: round(v * 1000, 3) for k, v in self.phases.items()},
+            "counters": dict(self.counters),
+        }
+
+def current():
+    stack = getattr(_local, "stack", None)
+    return stack[-1] if stack else None
+
+def phase(name):
+    """with phase("decode"): ...  未开启或不在节点执行中时为空操作。"""
+    prof = current()
+    return prof.phase(name) if prof is not None else _NULL
+
+def count(key, n=1):
+    prof = current()
+    if prof is not None: prof.count(key, n)
+
+def set_value(key, value):
+    prof = current()
+    if prof is not None: prof.set(key, value)
+
+def _output_directory():
+    try:
+        import folder_paths
+        return folder_paths.get_output_directory()
+    except Exception:
+        return os.getcwd()
+
+def _record(summary):
+    global _dirty
+    with _totals_lock:
+        total = _totals.setdefault(summary["node"], {"calls": 0, "total_ms": 0.0, "phases_ms": {}, "counters": {}})
+        total["calls"] += 1
+        total["total_ms"] += summary["total_ms"]
+        for k, v in summary["phases_ms"].items():
+            total["phases_ms"][k] = total["phases_ms"].get(k, 0.0) + v
+        for k, v in summary["counters"].items():
+            # 速率类指标记录最近一次，计数类累加
+            if isinstance(v, float): total["counters"][k] = v
+            else: total["counters"][k] = total["counters"].get(k, 0) + v
+        _dirty = True
+        due = time.monotonic() - _last_dump >= DUMP_INTERVAL
+    if due: dump()
+
+def dump():
+    """把累计结果写入 matrix_profile.json (同目录临时文件 + os.replace)；没有新记录时不写。"""
+    global _dirty, _last_dump
+    with _dump_lock:
+        with _totals_lock:
+            if not _dirty: return
+            _dirty = False
+            _last_dump = time.monotonic()
+            snapshot = json.dumps({"updated": time.strftime("%Y-%m-%d %H:%M:%S"), "nodes": _totals}, indent=2, ensure_ascii=False)
+        tmp_path = None
+        try:
+            path = os.path.join(_output_directory(), DUMP_FILENAME)
+            fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix=DUMP_FILENAME + ".", suffix=".tmp")
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                f.write(snapshot)
+            os.replace(tmp_path, path)
+        except Exception as e:
+            print(f"MatrixProfiler Error: {e}")
+            if tmp_path is not None:
+                try: os.remove(tmp_path)
+                except OSError: pass
+
+if ENABLED: atexit.register(dump)
+
+def get_totals():
+    with _totals_lock:
+        return json.loads(json.dumps(_totals))
+
+def _attach(output, summary):
+    # 把本次剖析结果并入节点返回值的 ui 部分
+    if isinstance(output, dict):
+        ui = dict(output.get("ui") or {})
+        ui["matrix_profile"] = [summary]
+        output = dict(output)
+        output["ui"] = ui
+        return output
+    return {"ui": {"matrix_profile": [summary]}, "result": output}
+
+def profiled(fn):
+    """节点入口装饰器：开启时记录本次执行，节点名取实际类名。"""
+    @functools.wraps(fn)
+    def wrapper(self, *args, **kwargs):
+        if not ENABLED: return fn(self, *args, **kwargs)
+        prof = NodeProfile(type(self).__name__)
+        stack = getattr(_local, "stack", None)
+        if stack is None: stack = _local.stack = []
+        stack.append(prof)
+        try:
+            output = fn(self, *args, **kwargs)
+        finally:
+            stack.pop()
+        summary = prof.summary()
+        _record(summary)
+        return _attach(output, summary)
+    return wrapper
+
+def timed_iter(name, iterable):
+    """把迭代器每次产出的耗时计入阶段 name (用于生成器式的流水线)。"""
+    it = iter(iterable)
+    while True:
+        with phase(name):
+            try:
+                item = next(it)
+            except StopIteration:
+                return
+        yield item
@@ -1,7 +1,16 @@
+import io
 import math
-import torch
-import comfy.utils
-import node_helpers
+import os
+from .lazy_import import lazy_import
+from .matrix_profiler import profiled, phase, count as profile_count
+from .image_utils import to_float_image
+from .latent_store import get_latent_store, vae_identity, image_hash
+from .dataset_shards import is_shard_member, split_shard_member, read_tar_member
+from . import asset_resolver
+
+# 延迟到第一次执行时加载
+comfy_utils = lazy_import("comfy.utils")
+node_helpers = lazy_import("node_helpers")
 
 def is_valid_image(img):
     if img is None: return False
@@ -12,6 +21,12 @@ def is_valid_image(img):
         return False
     return True
 
+LATENT_STORE_TOOLTIP = "参考 Latent 离线库目录 (留空=不使用，default=~/.cache/matrix_nodes/qwen_latents)。命中时直接读取，未命中才 vae.encode 并写入"
+
+def encode_reference(vae, image, store, vae_id):
+    if store is None: return vae.encode(image[:, :, :, :3])
+    return store.encode(vae, image, vae_id)
+
 # ========================================================
 # 节点 1: 5图标准版
 # ========================================================
@@ -42,6 +57,7 @@ class MatrixTextEncodeQwen5:
             },
             "optional": {
                 "vae": ("VAE", ),
+                "latent_store": ("STRING", {"default": "", "tooltip": LATENT_STORE_TOOLTIP}),
                 "image1": ("IMAGE", ),
                 "image2": ("IMAGE", ),
                 "image3": ("IMAGE", ),
@@ -55,8 +71,13 @@ class MatrixTextEncodeQwen5:
     
     CATEGORY = "Custom/Matrix"
     
-    def encode(self, clip, prompt, negative_prompt, smart_input, align_latent, vae=None, image1=None, image2=None, image3=None, image4=None, image5=None):
+    @profiled
+    def encode(self, clip, prompt, negative_prompt, smart_input, align_latent, vae=None, latent_store="", image1=None, image2=None, image3=None, image4=None, image5=None):
         raw_inputs = [image1, image2, image3, image4, image5]
+        # 加载器的 fp16 / uint8 紧凑输出在这里转回 float32
+        raw_inputs = [to_float_image(img) if img is not None else None for img in raw_inputs]
+        store = get_latent_store(latent_store) if vae is not None else None
+        vae_id = vae_identity(vae) if store is not None else None
         
         # 1. 确定谁是主角 (Align Target)
         target_img = None
@@ -87,7 +108,8 @@ class MatrixTextEncodeQwen5:
             final_images.append(target_img)
             # 计算 Latent
             if vae is not None:
-                output_latent = vae.encode(target_img[:, :, :, :3])
+                with phase("vae_encode"):
+                    output_latent = encode_reference(vae, target_img, store, vae_id)
         
         # 把其他配角接在后面
         final_images.extend(other_images)
@@ -112,19 +134,22 @@ class MatrixTextEncodeQwen5:
             scale_by = math.sqrt(total / (samples.shape[3] * samples.shape[2]))
             width = round(samples.shape[3] * scale_by)
             height = round(samples.shape[2] * scale_by)
-            s = comfy.utils.common_upscale(samples, width, height, "area", "disabled")
+            with phase("vl_resize"):
+                s = comfy_utils.common_upscale(samples, width, height, "area", "disabled")
             images_vl.append(s.movedim(1, -1))
             
             if vae is not None:
-                l = vae.encode(image[:, :, :, :3])
+                with phase("vae_encode"):
+                    l = encode_reference(vae, image, store, vae_id)
                 ref_latents.append(l)
                 
             image_prompt += "Picture {}: <|vision_start|><|image_pad|><|vision_end|>".format(i + 1)
                 
-        tokens = clip.tokenize(image_prompt + prompt, images=images_vl, llama_template=llama_template)
-        conditioning = clip.encode_from_tokens_scheduled(tokens)
-        tokensN = clip.tokenize(image_prompt + negative_prompt, images=images_vl, llama_template=llama_template)
-        conditioningN = clip.encode_from_tokens_scheduled(tokensN)
+        with phase("clip_encode"):
+            tokens = clip.tokenize(image_prompt + prompt, images=images_vl, llama_template=llama_template)
+            conditioning = clip.encode_from_tokens_scheduled(tokens)
+            tokensN = clip.tokenize(image_prompt + negative_prompt, images=images_vl, llama_template=llama_template)
+            conditioningN = clip.encode_from_tokens_scheduled(tokensN)
         
         if len(ref_latents) > 0:
             conditioning = node_helpers.conditioning_set_values(conditioning, {"reference_latents": ref_latents}, append=True)
@@ -157,6 +182,7 @@ class MatrixTextEncodeQwen10:
             },
             "optional": {
                 "vae": ("VAE", ),
+                "latent_store": ("STRING", {"default": "", "tooltip": LATENT_STORE_TOOLTIP}),
                 "image1": ("IMAGE", ), "image2": ("IMAGE", ), "image3": ("IMAGE", ), "image4": ("IMAGE", ), "image5": ("IMAGE", ),
                 "image6": ("IMAGE", ), "image7": ("IMAGE", ), "image8": ("IMAGE", ), "image9": ("IMAGE", ), "image10": ("IMAGE", ),
             }}
@@ -167,8 +193,13 @@ class MatrixTextEncodeQwen10:
     
     CATEGORY = "Custom/Matrix"
     
-    def encode(self, clip, prompt, negative_prompt, smart_input, align_latent, vae=None, image1=None, image2=None, image3=None, image4=None, image5=None, image6=None, image7=None, image8=None, image9=None, image10=None):
+    @profiled
+    def encode(self, clip, prompt, negative_prompt, smart_input, align_latent, vae=None, latent_store="", image1=None, image2=None, image3=None, image4=None, image5=None, image6=None, image7=None, image8=None, image9=None, image10=None):
         raw_inputs = [image1, image2, image3, image4, image5, image6, image7, image8, image9, image10]
+        # 加载器的 fp16 / uint8 紧凑输出在这里转回 float32
+        raw_inputs = [to_float_image(img) if img is not None else None for img in raw_inputs]
+        store = get_latent_store(latent_store) if vae is not None else None
+        vae_id = vae_identity(vae) if store is not None else None
         
         target_img = None
         other_images = []
@@ -192,7 +223,8 @@ class MatrixTextEncodeQwen10:
         if target_img is not None:
             final_images.append(target_img)
             if vae is not None:
-                output_latent = vae.encode(target_img[:, :, :, :3])
+                with phase("vae_encode"):
+                    output_latent = encode_reference(vae, target_img, store, vae_id)
         
         final_images.extend(other_images)
         
@@ -215,18 +247,21 @@ class MatrixTextEncodeQwen10:
             scale_by = math.sqrt(total / (samples.shape[3] * samples.shape[2]))
             width = round(samples.shape[3] * scale_by)
             height = round(samples.shape[2] * scale_by)
-            s = comfy.utils.common_upscale(samples, width, height, "area", "disabled")
+            with phase("vl_resize"):
+                s = comfy_utils.common_upscale(samples, width, height, "area", "disabled")
             images_vl.append(s.movedim(1, -1))
             
             if vae is not None:
-                l = vae.encode(image[:, :, :, :3])
+                with phase("vae_encode"):
+                    l = encode_reference(vae, image, store, vae_id)
                 ref_latents.append(l)
             image_prompt += "Picture {}: <|vision_start|><|image_pad|><|vision_end|>".format(i + 1)
                 
-        tokens = clip.tokenize(image_prompt + prompt, images=images_vl, llama_template=llama_template)
-        conditioning = clip.encode_from_tokens_scheduled(tokens)
-        tokensN = clip.tokenize(image_prompt + negative_prompt, images=images_vl, llama_template=llama_template)
-        conditioningN = clip.encode_from_tokens_scheduled(tokensN)
+        with phase("clip_encode"):
+            tokens = clip.tokenize(image_prompt + prompt, images=images_vl, llama_template=llama_template)
+            conditioning = clip.encode_from_tokens_scheduled(tokens)
+            tokensN = clip.tokenize(image_prompt + negative_prompt, images=images_vl, llama_template=llama_template)
+            conditioningN = clip.encode_from_tokens_scheduled(tokensN)
         
         if len(ref_latents) > 0:
             conditioning = node_helpers.conditioning_set_values(conditioning, {"reference_latents": ref_latents}, append=True)
@@ -234,12 +269,85 @@ class MatrixTextEncodeQwen10:
         
         return (conditioning, conditioningN, {"samples": output_latent}, )
 
+# ========================================================
+# 节点 3: 参考 Latent 预计算
+# ========================================================
+class MatrixQwenLatentPrecompute:
+    """
+    把参考图文件夹整体 vae.encode 一遍写入离线库，之后 Qwen 编码器按图片内容哈希直接读取。
+    """
+
+    DESCRIPTION = """
+    【Qwen 参考 Latent 预计算】
+    参考图库固定时，先用本节点把整个文件夹编码进离线库 (safetensors，按 VAE + 图片内容索引)。
+    Qwen 编码器的 latent_store 填同一目录后，命中的参考图不再重复 VAE 编码。
+    已在库中的图片自动跳过，重复运行只编码新增 / 修改过的图片。
+    """
+
+    @classmethod
+    def INPUT_TYPES(s):
+        return {"required": {
+            "vae": ("VAE", ),
+            "folder_path": ("STRING", {"default": "", "tooltip": "参考图文件夹"}),
+            "latent_store": ("STRING", {"default": "default", "tooltip": LATENT_STORE_TOOLTIP}),
+            },
+            "optional": {
+                "recursive": ("BOOLEAN", {"default": False, "tooltip": "包含子文件夹中的图片"}),
+            }}
+
+    RETURN_TYPES = ("INT", "INT")
+    RETURN_NAMES = ("Encoded", "Total")
+    FUNCTION = "precompute"
+    OUTPUT_NODE = True
+    CATEGORY = "Custom/Matrix"
+
+    @classmethod
+    def IS_CHANGED(s, folder_path, latent_store="default", recursive=False, **kwargs):
+        # 文件夹内容 (名字 + mtime/size) 不变就不必重跑；VAE 换了由 ComfyUI 的上游变化触发
+        catalog, names = asset_resolver.list_assets(folder_path, recursive=recursive)
+        if catalog is None: return f"missing:{folder_path}"
+        return asset_resolver.fingerprint([latent_store] + [asset_resolver.signature(catalog, n) for n in names])
+
+    @profiled
+    def precompute(self, vae, folder_path, latent_store="default", recursive=False):
+        # 与加载器共用解码路径 (包括解码帧缓存)；包在导入完成后才有这个函数
+        from . import load_image_file
+        store = get_latent_store(latent_store)
+        if store is None:
+            print("MatrixQwenLatentPrecompute Error: latent_store is empty")
+            return (0, 0)
+        catalog, names = asset_resolver.list_assets(folder_path, recursive=recursive)
+        if catalog is None:
+            print(f"MatrixQwenLatentPrecompute Error: Path not found: {folder_path}")
+            return (0, 0)
+        vae_id = vae_identity(vae)
+        encoded = 0
+        for name in names:
+            with phase("decode"):
+                if is_shard_member(name):
+                    tar_name, member = split_shard_member(name)
+                    data = read_tar_member(os.path.join(folder_path, tar_name), member)
+                    image = load_image_file(io.BytesIO(data)) if data is not None else None
+                else:
+                    image = load_image_file(os.path.join(folder_path, name))
+            if image is None: continue
+            key = image_hash(image)
+            if os.path.exists(store.path_for(vae_id, key)): continue
+            with phase("vae_encode"):
+                latent = vae.encode(image[:, :, :, :3])
+            store.put(vae_id, key, latent)
+            encoded += 1
+        profile_count("images", len(names))
+        return {"ui": {"text": [f"Encoded {encoded} / {len(names)} references → {store.root}"]}, "result": (encoded, len(names))}
+
 NODE_CLASS_MAPPINGS = {
     "MatrixTextEncodeQwen5": MatrixTextEncodeQwen5,
-    "MatrixTextEncodeQwen10": MatrixTextEncodeQwen10
+    "MatrixTextEncodeQwen10": MatrixTextEncodeQwen10,
+    "MatrixQwenLatentPrecompute": MatrixQwenLatentPrecompute
 }
 
 NODE_DISPLAY_NAME_MAPPINGS = {
     "MatrixTextEncodeQwen5": "Matrix Qwen Encode (5)",
-    "MatrixTextEncodeQwen10": "Matrix Qwen Encode (10 Experimental)"
+    "MatrixTextEncodeQwen10": "Matrix Qwen Encode (10 Experimental)",
+    "MatrixQwenLatentPrecompute": "🧩 Matrix Qwen Latent Precompute | Qwen参考Latent预计算"
 }
\ No newline at end of file
@@ -1,13 +1,210 @@
 import os
+import re
 import shutil
 import subprocess
 import torch
 import torch.nn.functional as F
 import numpy as np
 import folder_paths
-import soundfile as sf
 from PIL import Image
 import random
+import threading
+import time
+import atexit
+from collections import deque
+from .image_utils import CHUNK_FRAMES, PRECISIONS, to_uint8_into, to_float_image, cast_precision
+from .matrix_profiler import profiled, phase, set_value, timed_iter, count as profile_count
+from .lazy_import import lazy_import
+
+# 延迟到第一次执行时加载：soundfile 只在 Temp WAV 混流时需要
+sf = lazy_import("soundfile")
+
+PREVIEW_BOX = (256, 256)
+
+def _write_audio_pipe(fd, data):
+    # 后台线程：把 PCM 数据写入 ffmpeg 的第二路管道
+    # 开启 -shortest 时 ffmpeg 可能提前关闭读端，此时忽略 BrokenPipe
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+    except (BrokenPipeError, OSError):
+        pass
+
+def get_ffmpeg_path():
+    ffmpeg_path = shutil.which("ffmpeg")
+    if ffmpeg_path: return ffmpeg_path
+    base_path = os.path.abspath(os.path.join(os.path.dirname(__file__), "../../.."))
+    possible_paths = [
+        os.path.join(base_path, "ffmpeg/bin/ffmpeg.exe"),
+        os.path.join(base_path, "ffmpeg/ffmpeg-exe/bin/ffmpeg.exe"),
+        os.path.join(base_path, "venv/Scripts/ffmpeg.exe"),
+    ]
+    for path in possible_paths:
+        if os.path.exists(path): return path
+    try:
+        import imageio_ffmpeg
+        return imageio_ffmpeg.get_ffmpeg_exe()
+    except: pass
+    return None
+
+def compute_aspect_plan(curr_h, curr_w, aspect_ratio, resize_mode, even_dims=False):
+    """
+    只计算比例修正方案，不触碰像素。
+    返回 (resize_to, crop_box)：resize_to=(h, w) 表示拉伸到该尺寸 (None=不拉伸)，crop_box=(y, x, h, w) 为裁切区域。
+    even_dims=True 时把裁切区域修剪为偶数宽高 (h264 要求)。
+    """
+    resize_to = None
+    crop_box = (0, 0, curr_h, curr_w)
+    target_ratio = None
+    if aspect_ratio != "Original":
+        try:
+            w_ratio, h_ratio = map(int, aspect_ratio.split(":"))
+            target_ratio = w_ratio / h_ratio
+        except: pass
+    if target_ratio:
+        target_h_by_w = int(curr_w / target_ratio)
+        target_w_by_h = int(curr_h * target_ratio)
+        if resize_mode == "Crop Center":
+            if target_h_by_w <= curr_h:
+                final_w, final_h = curr_w, target_h_by_w
+            else:
+                final_w, final_h = target_w_by_h, curr_h
+            final_w -= final_w % 2
+            final_h -= final_h % 2
+            center_y, center_x = curr_h // 2, curr_w // 2
+            start_y = max(0, center_y - final_h // 2)
+            start_x = max(0, center_x - final_w // 2)
+            crop_box = (start_y, start_x, final_h, final_w)
+        elif resize_mode == "Stretch":
+            final_w = curr_w
+            final_h = int(curr_w / target_ratio)
+            final_w -= final_w % 2
+            final_h -= final_h % 2
+            resize_to = (final_h, final_w)
+    if even_dims and resize_to is None:
+        y, x, h, w = crop_box
+        crop_box = (y, x, h - h % 2, w - w % 2)
+    return resize_to, crop_box
+
+def iter_uint8_chunks(images, resize_to, crop_box, chunk_size=CHUNK_FRAMES):
+    """
+    融合管线：裁切/拉伸 -> clamp -> *255 -> uint8，按 chunk 在 CPU 上完成，不生成整批 float 中间结果。
+    yield (起始帧号, uint8 numpy 视图)。视图指向复用的缓冲区，调用方需在下一次迭代前用完。
+    """
+    if not isinstance(images, torch.Tensor): images = torch.from_numpy(np.asarray(images))
+    batch, channels = images.shape[0], images.shape[-1]
+    y, x, h, w = crop_box
+    out_h, out_w = resize_to if resize_to else (h, w)
+    work = torch.empty((min(chunk_size, batch), out_h, out_w, channels), dtype=torch.float32)
+    out = torch.empty(work.shape, dtype=torch.uint8)
+    for start in range(0, batch, chunk_size):
+        chunk = images[start:start + chunk_size, y:y + h, x:x + w, :].cpu()
+        n = chunk.shape[0]
+        if resize_to and resize_to != (h, w):
+            chunk = F.interpolate(to_float_image(chunk).permute(0, 3, 1, 2), size=resize_to, mode="bilinear", align_corners=False).permute(0, 2, 3, 1)
+        to_uint8_into(chunk, work[:n], out[:n])
+        yield start, out[:n].numpy()
+
+# BT.601 limited range，与 ffmpeg 对未标注色彩信息的 rgb24 -> yuv420p 默认转换一致；输入 RGB 为 0-1
+YUV_COEFFS = (
+    (65.481, 128.553, 24.966),
+    (-37.797, -74.203, 112.0),
+    (112.0, -93.786, -18.214),
+)
+PIPE_FORMATS = ["rgb24", "yuv420p"]
+
+def iter_yuv420_chunks(images, resize_to, crop_box, chunk_size=CHUNK_FRAMES):
+    """
+    与 iter_uint8_chunks 相同的裁切/拉伸，随后在张量侧转换为平面 YUV420 (I420)，数据量只有 rgb24 的一半。
+    每帧依次为 Y (h*w)、U、V (各 h/2*w/2)；色度取 2x2 像素平均。宽高须为偶数 (compute_aspect_plan 的 even_dims)。
+    yield (起始帧号, (n, h*w*3/2) uint8 numpy 视图)。视图指向复用的缓冲区，调用方需在下一次迭代前用完。
+    """
+    if not isinstance(images, torch.Tensor): images = torch.from_numpy(np.asarray(images))
+    batch = images.shape[0]
+    y, x, h, w = crop_box
+    out_h, out_w = resize_to if resize_to else (h, w)
+    area, quarter = out_h * out_w, (out_h // 2) * (out_w // 2)
+    coeffs = torch.tensor(YUV_COEFFS, dtype=torch.float32).T
+    out = torch.empty((min(chunk_size, batch), area + 2 * quarter), dtype=torch.uint8)
+    for start in range(0, batch, chunk_size):
+        chunk = to_float_image(images[start:start + chunk_size, y:y + h, x:x + w, :].cpu())
+        n = chunk.shape[0]
+        if resize_to and resize_to != (h, w):
+            chunk = F.interpolate(chunk.permute(0, 3, 1, 2), size=resize_to, mode="bilinear", align_corners=False).permute(0, 2, 3, 1)
+        if chunk.shape[-1] == 1: chunk = chunk.expand(-1, -1, -1, 3)
+        rgb = chunk[..., :3].clamp(0, 1)
+        luma = torch.matmul(rgb, coeffs[:, :1])
+        # 先对 RGB 做 2x2 平均再转换 (线性变换可交换)，色度只需计算 1/4 的像素
+        rgb = rgb.reshape(n, out_h // 2, 2, out_w // 2, 2, 3).mean(dim=(2, 4))
+        chroma = torch.matmul(rgb, coeffs[:, 1:]).permute(0, 3, 1, 2)
+        planes = out[:n]
+        # +0.5 后 copy_ 截断 = 四舍五入
+        planes[:, :area].copy_(luma.reshape(n, area).add_(16.5).clamp_(0, 255))
+        planes[:, area:].view(n, 2, quarter).copy_(chroma.reshape(n, 2, quarter).add_(128.5).clamp_(0, 255))
+        yield start, planes.numpy()
+
+class _FFmpegEncoder:
+    """
+    一个运行中的 ffmpeg 编码进程：rawvideo 帧走 stdin，音频 (可选) 走第二路管道或临时 wav。
+    stderr 由后台线程持续读取，长时间会话也不会因管道写满而卡死。
+    """
+    def __init__(self, process, audio_thread=None, temp_audio_path=None):
+        self.process = process
+        self.audio_thread = audio_thread
+        self.temp_audio_path = temp_audio_path
+        self.log_tail = deque(maxlen=20)
+        self.finished = False
+        self.stderr_thread = threading.Thread(target=self._drain_stderr, daemon=True)
+        self.stderr_thread.start()
+
+    def _drain_stderr(self):
+        for line in iter(self.process.stderr.readline, b""):
+            self.log_tail.append(line.decode("utf-8", errors="replace").rstrip())
+
+    def write(self, chunk):
+        try:
+            self.process.stdin.write(chunk)
+        except (BrokenPipeError, OSError):
+            self.finish()
+            raise RuntimeError("Matrix Video Error: ffmpeg exited early.\n" + "\n".join(self.log_tail))
+
+    def finish(self):
+        if self.finished: return
+        self.finished = True
+        try:
+            if not self.process.stdin.closed: self.process.stdin.close()
+        except (BrokenPipeError, OSError): pass
+        self.process.wait()
+        self.stderr_thread.join()
+        if self.audio_thread is not None: self.audio_thread.join()
+        if self.temp_audio_path and os.path.exists(self.temp_audio_path): os.remove(self.temp_audio_path)
+        if self.process.returncode != 0:
+            print(f"Matrix Video Error: ffmpeg returned {self.process.returncode}\n" + "\n".join(self.log_tail))
+
+class _VideoSession:
+    """跨多次执行保持打开的编码会话，每次执行追加一个 chunk，直到 finalize。"""
+    def __init__(self, encoder, source_size, resize_to, crop_box, file_path, counter, pipe_format="rgb24"):
+        self.encoder = encoder
+        self.pipe_format = pipe_format
+        self.source_size = source_size
+        self.resize_to = resize_to
+        self.crop_box = crop_box
+        self.file_path = file_path
+        self.counter = counter
+        self.frames_written = 0
+
+# session_id -> _VideoSession
+_SESSIONS = {}
+_SESSIONS_LOCK = threading.Lock()
+
+@atexit.register
+def _close_open_sessions():
+    # 进程退出时收尾所有未 finalize 的会话，保证已写入的部分是可播放文件
+    with _SESSIONS_LOCK:
+        sessions = list(_SESSIONS.values())
+        _SESSIONS.clear()
+    for session in sessions:
+        session.encoder.finish()
 
 class MatrixVideoCombine:
     """
@@ -24,6 +221,8 @@ class MatrixVideoCombine:
     2. 比例修正：支持 Crop(裁切)/Stretch(拉伸)，完美解决 1088px 黑边问题。
     3. 动图预览：生成临时的 WebP 动图，解决界面预览不动的问题。
     4. 音频混流：支持输入 Audio 节点，自动合成音视频。
+    5. 分段渲染：填写 session_id 后多次执行共用一个 ffmpeg 进程，逐段追加帧，finalize_session 时完成文件。
+    6. YUV 管道：h264 输出时 pipe_format=yuv420p 在张量侧完成色彩转换，管道数据量减半，ffmpeg 不再做 swscale。
     """
     
     @classmethod
@@ -42,6 +241,10 @@ class MatrixVideoCombine:
             },
             "optional": {
                 "audio": ("AUDIO", {"tooltip": "音频输入 (可选)"}), 
+                "audio_mux": (["Pipe", "Temp WAV"], {"default": "Pipe", "tooltip": "音频混流方式：Pipe=PCM 直通管道 (无临时文件)；Temp WAV=先写临时 wav。Windows 下自动使用 Temp WAV"}),
+                "session_id": ("STRING", {"default": "", "tooltip": "分段渲染会话 ID (留空=关闭)。相同 ID 的多次执行共用一个 ffmpeg 进程，逐段追加帧"}),
+                "finalize_session": ("BOOLEAN", {"default": False, "tooltip": "写入本段后结束会话并完成文件 (配合 Loop 的最后一次迭代)"}),
+                "pipe_format": (PIPE_FORMATS, {"default": "rgb24", "tooltip": "送入 ffmpeg 的像素格式 (仅 h264-mp4 生效)：rgb24=由 ffmpeg 转 yuv420p；yuv420p=张量侧转换 (BT.601，色度 2x2 平均)，管道数据量减半"}),
             }
         }
 
@@ -51,89 +254,55 @@ class MatrixVideoCombine:
     CATEGORY = "Custom/Matrix"
     FUNCTION = "combine_video"
 
+    @classmethod
+    def IS_CHANGED(s, session_id="", **kwargs):
+        # 会话模式每次执行都要追加帧，不能被缓存跳过
+        if session_id: return float("nan")
+        return ""
+
     def get_ffmpeg_path(self):
-        ffmpeg_path = shutil.which("ffmpeg")
-        if ffmpeg_path: return ffmpeg_path
-        base_path = os.path.abspath(os.path.join(os.path.dirname(__file__), "../../.."))
-        possible_paths = [
-            os.path.join(base_path, "ffmpeg/bin/ffmpeg.exe"),
-            os.path.join(base_path, "ffmpeg/ffmpeg-exe/bin/ffmpeg.exe"),
-            os.path.join(base_path, "venv/Scripts/ffmpeg.exe"),
-        ]
-        for path in possible_paths:
-            if os.path.exists(path): return path
-        try:
-            import imageio_ffmpeg
-            return imageio_ffmpeg.get_ffmpeg_exe()
-        except: pass
-        return None
+        return get_ffmpeg_path()
 
     def process_aspect_ratio(self, images, aspect_ratio, resize_mode):
-        if aspect_ratio == "Original": return images
         _, curr_h, curr_w, _ = images.shape
-        try:
-            w_ratio, h_ratio = map(int, aspect_ratio.split(":"))
-            target_ratio = w_ratio / h_ratio
-        except: return images
-        target_h_by_w = int(curr_w / target_ratio)
-        target_w_by_h = int(curr_h * target_ratio)
-        if resize_mode == "Crop Center":
-            if target_h_by_w <= curr_h:
-                final_w, final_h = curr_w, target_h_by_w
-            else:
-                final_w, final_h = target_w_by_h, curr_h
-            final_w -= final_w % 2
-            final_h -= final_h % 2
-            center_y, center_x = curr_h // 2, curr_w // 2
-            start_y = max(0, center_y - final_h // 2)
-            start_x = max(0, center_x - final_w // 2)
-            images = images[:, start_y:start_y+final_h, start_x:start_x+final_w, :]
-        elif resize_mode == "Stretch":
-            final_w = curr_w
-            final_h = int(curr_w / target_ratio)
-            final_w -= final_w % 2
-            final_h -= final_h % 2
+        resize_to, (y, x, h, w) = compute_aspect_plan(curr_h, curr_w, aspect_ratio, resize_mode)
+        images = to_float_image(images[:, y:y+h, x:x+w, :])
+        if resize_to:
             img_permuted = images.permute(0, 3, 1, 2)
-            img_resized = F.interpolate(img_permuted, size=(final_h, final_w), mode="bilinear", align_corners=False)
+            img_resized = F.interpolate(img_permuted, size=resize_to, mode="bilinear", align_corners=False)
             images = img_resized.permute(0, 2, 3, 1)
         return images
 
-    def combine_video(self, images, frame_rate, loop_count, filename_prefix, format, crf, preview_gif, aspect_ratio, resize_mode, audio=None):
-        ffmpeg_path = self.get_ffmpeg_path()
-        if ffmpeg_path is None:
-            raise RuntimeError("Matrix Video Error: ffmpeg.exe not found!")
-
-        images = self.process_aspect_ratio(images, aspect_ratio, resize_mode)
-        output_dir = folder_paths.get_output_directory()
-        full_output_folder, filename, counter, subfolder, filename_prefix = folder_paths.get_save_image_path(filename_prefix, output_dir, images[0].shape[1], images[0].shape[0])
-        
-        ext = {"video/h264-mp4": "mp4", "video/webp": "webp", "image/gif": "gif"}.get(format, "mp4")
-        file_name = f"{filename}_{counter:05}_.{ext}"
-        file_path = os.path.join(full_output_folder, file_name)
-
-        if isinstance(images, torch.Tensor): images_np = images.cpu().numpy()
-        else: images_np = images
-        images_np = (np.clip(images_np, 0, 1) * 255).astype(np.uint8)
-        batch, height, width, channels = images_np.shape
-
-        if format == "video/h264-mp4" and (width % 2 != 0 or height % 2 != 0):
-            width -= width % 2
-            height -= height % 2
-            images_np = images_np[:, :height, :width, :]
+    def prepare_audio(self, audio):
+        waveform = audio['waveform'].squeeze().cpu().numpy()
+        sample_rate = audio['sample_rate']
+        if waveform.ndim == 2 and waveform.shape[0] < waveform.shape[1]: waveform = waveform.T
+        return np.ascontiguousarray(waveform, dtype=np.float32), sample_rate
 
+    def start_encoder(self, ffmpeg_path, file_path, width, height, frame_rate, format, crf, loop_count, counter, audio=None, audio_mux="Pipe", pipe_format="rgb24"):
         audio_args = []
         temp_audio_path = None
+        audio_pcm = None
+        audio_fd_r = audio_fd_w = None
         if audio is not None:
             try:
-                waveform = audio['waveform'].squeeze().cpu().numpy()
-                sample_rate = audio['sample_rate']
-                if waveform.ndim == 2 and waveform.shape[0] < waveform.shape[1]: waveform = waveform.T
-                temp_audio_path = os.path.join(folder_paths.get_temp_directory(), f"matrix_audio_{counter}.wav")
-                sf.write(temp_audio_path, waveform, sample_rate)
-                audio_args = ["-i", temp_audio_path, "-c:a", "aac", "-shortest"] 
+                waveform, sample_rate = self.prepare_audio(audio)
+                # pass_fds 仅 POSIX 可用，Windows 回退到临时 wav
+                if audio_mux == "Pipe" and os.name != 'nt':
+                    channels = 1 if waveform.ndim == 1 else waveform.shape[1]
+                    audio_fd_r, audio_fd_w = os.pipe()
+                    audio_pcm = waveform
+                    audio_args = ["-f", "f32le", "-ar", str(sample_rate), "-ac", str(channels), "-i", f"pipe:{audio_fd_r}", "-c:a", "aac", "-shortest"]
+                else:
+                    temp_audio_path = os.path.join(folder_paths.get_temp_directory(), f"matrix_audio_{counter}.wav")
+                    sf.write(temp_audio_path, waveform, sample_rate)
+                    audio_args = ["-i", temp_audio_path, "-c:a", "aac", "-shortest"] 
+            except ImportError as e:
+                # 缺少 soundfile 时照常输出无声视频，但要说明原因
+                print(f"MatrixVideoCombine Error: {e}；本次输出无声视频 (安装 soundfile，或在非 Windows 系统上改用 Audio Mux = Pipe)")
             except: pass
 
-        args = [ffmpeg_path, "-y", "-f", "rawvideo", "-vcodec", "rawvideo", "-s", f"{width}x{height}", "-pix_fmt", "rgb24", "-r", str(frame_rate), "-i", "-"]
+        args = [ffmpeg_path, "-y", "-f", "rawvideo", "-vcodec", "rawvideo", "-s", f"{width}x{height}", "-pix_fmt", pipe_format, "-r", str(frame_rate), "-i", "-"]
         if audio_args: args.extend(audio_args)
         if format == "video/h264-mp4": args += ["-c:v", "libx264", "-pix_fmt", "yuv420p", "-crf", str(crf), "-preset", "slow"]
         elif format == "video/webp": args += ["-c:v", "libwebp", "-loop", str(loop_count), "-lossless", "0", "-quality", str(100 - crf*2)]
@@ -144,30 +313,304 @@ class MatrixVideoCombine:
         if os.name == 'nt':
             startupinfo = subprocess.STARTUPINFO()
             startupinfo.dwFlags |= subprocess.STARTF_USESHOWWINDOW
+        audio_thread = None
         try:
-            p = subprocess.Popen(args, stdin=subprocess.PIPE, stderr=subprocess.PIPE, startupinfo=startupinfo)
-            for i in range(batch): p.stdin.write(images_np[i].tobytes())
-            p.communicate()
-        finally:
+            pass_fds = (audio_fd_r,) if audio_fd_r is not None else ()
+            p = subprocess.Popen(args, stdin=subprocess.PIPE, stderr=subprocess.PIPE, startupinfo=startupinfo, pass_fds=pass_fds)
+            if audio_fd_r is not None:
+                # 读端已交给 ffmpeg，父进程关闭自己的副本，写端交给后台线程
+                os.close(audio_fd_r)
+                audio_fd_r = None
+                audio_thread = threading.Thread(target=_write_audio_pipe, args=(audio_fd_w, memoryview(audio_pcm).cast("B")), daemon=True)
+                audio_fd_w = None
+                audio_thread.start()
+        except:
             if temp_audio_path and os.path.exists(temp_audio_path): os.remove(temp_audio_path)
+            raise
+        finally:
+            for fd in (audio_fd_r, audio_fd_w):
+                if fd is not None: os.close(fd)
+        return _FFmpegEncoder(p, audio_thread, temp_audio_path)
+
+    def get_session(self, session_id, ffmpeg_path, images, frame_rate, loop_count, filename_prefix, format, crf, aspect_ratio, resize_mode, audio, audio_mux, pipe_format="rgb24"):
+        _, curr_h, curr_w, _ = images.shape
+        with _SESSIONS_LOCK:
+            session = _SESSIONS.get(session_id)
+            if session is not None:
+                if session.source_size != (curr_h, curr_w):
+                    raise RuntimeError(f"Matrix Video Error: session '{session_id}' expects {session.source_size[1]}x{session.source_size[0]} frames, got {curr_w}x{curr_h}")
+                return session
+            resize_to, crop_box = compute_aspect_plan(curr_h, curr_w, aspect_ratio, resize_mode, even_dims=(format == "video/h264-mp4"))
+            height, width = resize_to if resize_to else crop_box[2:]
+            output_dir = folder_paths.get_output_directory()
+            full_output_folder, filename, counter, subfolder, filename_prefix = folder_paths.get_save_image_path(filename_prefix, output_dir, width, height)
+            ext = {"video/h264-mp4": "mp4", "video/webp": "webp", "image/gif": "gif"}.get(format, "mp4")
+            file_path = os.path.join(full_output_folder, f"{filename}_{counter:05}_.{ext}")
+            # 音频只在会话创建时接入，整段音轨随后续 chunk 逐步被 ffmpeg 消费
+            encoder = self.start_encoder(ffmpeg_path, file_path, width, height, frame_rate, format, crf, loop_count, counter, audio, audio_mux, pipe_format)
+            session = _VideoSession(encoder, (curr_h, curr_w), resize_to, crop_box, file_path, counter, pipe_format)
+            _SESSIONS[session_id] = session
+            return session
+
+    @profiled
+    def combine_video(self, images, frame_rate, loop_count, filename_prefix, format, crf, preview_gif, aspect_ratio, resize_mode, audio=None, audio_mux="Pipe", session_id="", finalize_session=False, pipe_format="rgb24"):
+        ffmpeg_path = self.get_ffmpeg_path()
+        if ffmpeg_path is None:
+            raise RuntimeError("Matrix Video Error: ffmpeg.exe not found!")
+
+        batch = images.shape[0]
+        # yuv420p 管道只用于 h264；webp / gif 编码器需要 RGB 输入
+        if format != "video/h264-mp4": pipe_format = "rgb24"
+        session_id = session_id.strip()
+        if session_id:
+            session = self.get_session(session_id, ffmpeg_path, images, frame_rate, loop_count, filename_prefix, format, crf, aspect_ratio, resize_mode, audio, audio_mux, pipe_format)
+            encoder, resize_to, crop_box = session.encoder, session.resize_to, session.crop_box
+            pipe_format = session.pipe_format
+            file_path, counter = session.file_path, session.counter
+        else:
+            _, curr_h, curr_w, _ = images.shape
+            resize_to, crop_box = compute_aspect_plan(curr_h, curr_w, aspect_ratio, resize_mode, even_dims=(format == "video/h264-mp4"))
+            height, width = resize_to if resize_to else crop_box[2:]
+            output_dir = folder_paths.get_output_directory()
+            full_output_folder, filename, counter, subfolder, filename_prefix = folder_paths.get_save_image_path(filename_prefix, output_dir, width, height)
+            
+            ext = {"video/h264-mp4": "mp4", "video/webp": "webp", "image/gif": "gif"}.get(format, "mp4")
+            file_name = f"{filename}_{counter:05}_.{ext}"
+            file_path = os.path.join(full_output_folder, file_name)
+            encoder = self.start_encoder(ffmpeg_path, file_path, width, height, frame_rate, format, crf, loop_count, counter, audio, audio_mux, pipe_format)
+
+        preview_step = max(1, batch // 20)
+        preview_frames = []
+        t_start = time.perf_counter()
+        try:
+            chunks = iter_yuv420_chunks if pipe_format == "yuv420p" else iter_uint8_chunks
+            for start, chunk in timed_iter("convert", chunks(images, resize_to, crop_box)):
+                with phase("ffmpeg_write"):
+                    encoder.write(chunk)
+                if preview_gif:
+                    # 预览帧在 chunk 缓冲区被复用前抽取
+                    with phase("preview"):
+                        for i in range(start + (-start) % preview_step, start + len(chunk), preview_step):
+                            if pipe_format == "yuv420p":
+                                # YUV chunk 不能直接做预览，单独把这一帧转成 RGB
+                                frame = next(iter_uint8_chunks(images[i:i + 1], resize_to, crop_box))[1][0]
+                            else:
+                                frame = chunk[i - start]
+                            # 不查缩略图缓存：对整帧算内容哈希比直接缩小这一帧还慢，而且视频帧很少重复
+                            img = Image.fromarray(frame)
+                            img.thumbnail(PREVIEW_BOX)
+                            preview_frames.append(img)
+        except:
+            # 写入失败时结束进程；会话模式下同时丢弃该会话
+            if session_id:
+                with _SESSIONS_LOCK: _SESSIONS.pop(session_id, None)
+            encoder.finish()
+            raise
 
         ui_results = {"text": [file_path]}
+        if session_id:
+            session.frames_written += batch
+            if finalize_session:
+                with _SESSIONS_LOCK: _SESSIONS.pop(session_id, None)
+                with phase("ffmpeg_finish"):
+                    encoder.finish()
+                profile_count("bytes_written", os.path.getsize(file_path) if os.path.exists(file_path) else 0)
+                ui_results["text"].append(f"Session '{session_id}' finalized: {session.frames_written} frames")
+            else:
+                ui_results["text"].append(f"Session '{session_id}': {session.frames_written} frames written")
+        else:
+            with phase("ffmpeg_finish"):
+                encoder.finish()
+            profile_count("bytes_written", os.path.getsize(file_path) if os.path.exists(file_path) else 0)
+        profile_count("frames", batch)
+        elapsed = time.perf_counter() - t_start
+        if elapsed > 0: set_value("frames_per_sec", round(batch / elapsed, 2))
+
         if preview_gif:
             rand_id = random.randint(1000, 9999)
             pre_name = f"matrix_pre_{counter}_{rand_id}.webp"
             pre_path = os.path.join(folder_paths.get_temp_directory(), pre_name)
-            max_frames = 20
-            step = max(1, batch // max_frames)
-            frames = []
-            for i in range(0, batch, step):
-                img = Image.fromarray(images_np[i])
-                img.thumbnail((256, 256)) 
-                frames.append(img)
+            frames = preview_frames
             if frames:
                 frames[0].save(pre_path, format='WEBP', save_all=True, append_images=frames[1:], duration=100, loop=0, quality=80, method=6)
                 ui_results["images"] = [{"filename": pre_name, "subfolder": "", "type": "temp"}]
 
         return {"ui": ui_results, "result": (file_path,)}
 
-NODE_CLASS_MAPPINGS = {"MatrixVideoCombine": MatrixVideoCombine}
-NODE_DISPLAY_NAME_MAPPINGS = {"MatrixVideoCombine": "🧩 Matrix Video Combine | 矩阵-视频合成"}
\ No newline at end of file
+# ========================================================
+# 视频读取：ffmpeg 解码 -> rawvideo 管道 -> 张量
+# ========================================================
+
+_PROBE_SIZE = re.compile(r"Video:.*?(\d{2,5})x(\d{2,5})")
+_PROBE_FPS = re.compile(r"([\d.]+) (?:fps|tbr)")
+_PROBE_DURATION = re.compile(r"Duration: (\d+):(\d+):([\d.]+)")
+_PROBE_ROTATION = re.compile(r"(?:rotate\s*:\s*|rotation of )(-?[\d.]+)")
+
+def probe_video(ffmpeg_path, video_path):
+    """
+    用 ffmpeg -i 的输出解析 (宽, 高, fps, 时长秒)，不依赖 ffprobe (imageio-ffmpeg 只带 ffmpeg)。
+    宽高为 ffmpeg 自动旋转后的显示尺寸。解析失败返回 None。
+    """
+    result = subprocess.run([ffmpeg_path, "-hide_banner", "-i", video_path], stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+    info = result.stderr.decode("utf-8", errors="replace")
+    size = _PROBE_SIZE.search(info)
+    if size is None: return None
+    width, height = int(size.group(1)), int(size.group(2))
+    rotation = _PROBE_ROTATION.search(info)
+    if rotation and round(abs(float(rotation.group(1)))) % 180 == 90:
+        width, height = height, width
+    fps = _PROBE_FPS.search(info[size.start():])
+    duration = _PROBE_DURATION.search(info)
+    seconds = int(duration.group(1)) * 3600 + int(duration.group(2)) * 60 + float(duration.group(3)) if duration else 0.0
+    return width, height, float(fps.group(1)) if fps else 0.0, seconds
+
+def plan_output_size(src_w, src_h, width, height):
+    """width / height 为 0 时按原比例推算 (取偶数)，都为 0 保持原尺寸。"""
+    if width <= 0 and height <= 0: return src_w, src_h
+    if width <= 0: width = max(2, round(src_w * height / src_h / 2) * 2)
+    if height <= 0: height = max(2, round(src_h * width / src_w / 2) * 2)
+    return width, height
+
+def build_video_filter(start_frame, stride, out_size, src_size):
+    """帧范围 / 抽帧 / 缩放都放在 ffmpeg 滤镜里完成，管道里只出现需要的帧。"""
+    filters = []
+    if start_frame > 0 or stride > 1:
+        filters.append(f"select='gte(n\\,{start_frame})*not(mod(n-{start_frame}\\,{stride}))'")
+    if out_size != src_size:
+        filters.append(f"scale={out_size[0]}:{out_size[1]}:flags=area")
+    return ",".join(filters)
+
+def resolve_video_path(video_path):
+    """绝对路径直接使用；相对路径依次在 output / input 目录下查找 (Video Combine 的输出在 output 下)。"""
+    video_path = video_path.strip().strip('"')
+    if os.path.isabs(video_path) or os.path.isfile(video_path): return video_path
+    for base in (folder_paths.get_output_directory(), folder_paths.get_input_directory()):
+        candidate = os.path.join(base, video_path)
+        if os.path.isfile(candidate): return candidate
+    return video_path
+
+class MatrixVideoLoader:
+    DESCRIPTION = """
+    【🧩 矩阵-视频读取】
+    功能：把视频 (例如 Video Combine 输出的 MP4) 读回为图片序列，用于二次剪辑或重新编码。
+
+    🚀 核心特性：
+    1. 管道直读：ffmpeg 解码后通过 rawvideo 管道直接进入内存，不落地图片文件。
+    2. 只解需要的帧：起始帧 / 帧数 / 抽帧间隔 / 目标尺寸都在 ffmpeg 内完成，只有选中的帧会变成张量。
+    3. 输出帧数与有效帧率 (原帧率 / 抽帧间隔)，可直接接回 Video Combine。
+    """
+
+    @classmethod
+    def INPUT_TYPES(s):
+        return {
+            "required": {
+                "video_path": ("STRING", {"default": "", "multiline": False, "tooltip": "视频路径 (绝对路径，或相对 output / input 目录)"}),
+                "start_frame": ("INT", {"default": 0, "min": 0, "max": 10000000, "tooltip": "从第几帧开始 (0 起)"}),
+                "frame_count": ("INT", {"default": 0, "min": 0, "max": 100000, "tooltip": "最多读取多少帧 (0=读到结尾)"}),
+                "stride": ("INT", {"default": 1, "min": 1, "max": 1000, "tooltip": "抽帧间隔 (2=每两帧取一帧)"}),
+                "width": ("INT", {"default": 0, "min": 0, "max": 8192, "step": 2, "tooltip": "输出宽度 (0=按高度等比 / 原尺寸)"}),
+                "height": ("INT", {"default": 0, "min": 0, "max": 8192, "step": 2, "tooltip": "输出高度 (0=按宽度等比 / 原尺寸)"}),
+            },
+            "optional": {
+                "output_precision": (PRECISIONS, {"default": "fp32", "tooltip": "输出精度：fp32 标准 / fp16 半内存 / uint8 四分之一内存 (uint8 仅限 Matrix 节点：拼图、Qwen 编码、视频合成、数据集保存；其他节点按 0-1 浮点处理，会得到错误结果，请保持 fp32 / fp16)"}),
+            }
+        }
+
+    RETURN_TYPES = ("IMAGE", "INT", "FLOAT")
+    RETURN_NAMES = ("Images", "Frame_Count", "FPS")
+    FUNCTION = "load_video"
+    CATEGORY = "Custom/Matrix"
+
+    @classmethod
+    def IS_CHANGED(s, video_path=None, **kwargs):
+        # 连线的 video_path 在 IS_CHANGED 中为 None：不知道读哪个文件，每次都重新执行
+        if video_path is None: return float("nan")
+        try:
+            st = os.stat(resolve_video_path(video_path))
+            return f"{st.st_mtime_ns}:{st.st_size}"
+        except OSError:
+            return ""
+
+    def read_frames(self, stdout, frame_bytes, out_w, out_h, max_frames):
+        """按 chunk 读取 rawvideo (rgb24)，返回 uint8 张量列表。"""
+        chunks = []
+        total = 0
+        while max_frames <= 0 or total < max_frames:
+            n = CHUNK_FRAMES if max_frames <= 0 else min(CHUNK_FRAMES, max_frames - total)
+            buf = torch.empty((n, out_h, out_w, 3), dtype=torch.uint8)
+            view = memoryview(buf.numpy()).cast("B")
+            got = 0
+            while got < n * frame_bytes:
+                read = stdout.readinto(view[got:])
+                if not read: break
+                got += read
+            frames = got // frame_bytes
+            if frames: chunks.append(buf[:frames])
+            total += frames
+            if frames < n: break
+        return chunks
+
+    @profiled
+    def load_video(self, video_path, start_frame, frame_count, stride, width, height, output_precision="fp32"):
+        ffmpeg_path = get_ffmpeg_path()
+        if ffmpeg_path is None:
+            raise RuntimeError("Matrix Video Error: ffmpeg.exe not found!")
+        path = resolve_video_path(video_path)
+        if not os.path.isfile(path):
+            print(f"MatrixVideoLoader Error: Video not found {video_path}")
+            return (cast_precision(torch.zeros((1, 512, 512, 3)), output_precision), 0, 0.0)
+
+        with phase("probe"):
+            info = probe_video(ffmpeg_path, path)
+        if info is None:
+            print(f"MatrixVideoLoader Error: Could not read video stream from {path}")
+            return (cast_precision(torch.zeros((1, 512, 512, 3)), output_precision), 0, 0.0)
+        src_w, src_h, src_fps, _ = info
+        out_w, out_h = plan_output_size(src_w, src_h, width, height)
+        vf = build_video_filter(start_frame, stride, (out_w, out_h), (src_w, src_h))
+
+        cmd = [ffmpeg_path, "-v", "error", "-i", path, "-an"]
+        if vf: cmd += ["-vf", vf]
+        # select 会丢帧，-vsync 0 防止 ffmpeg 为保持帧率复制帧
+        cmd += ["-vsync", "0"]
+        if frame_count > 0: cmd += ["-frames:v", str(frame_count)]
+        cmd += ["-f", "rawvideo", "-pix_fmt", "rgb24", "-"]
+
+        process = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        log_tail = deque(maxlen=20)
+        def drain():
+            for line in iter(process.stderr.readline, b""):
+                log_tail.append(line.decode("utf-8", errors="replace").rstrip())
+        stderr_thread = threading.Thread(target=drain, daemon=True)
+        stderr_thread.start()
+        try:
+            with phase("decode"):
+                chunks = self.read_frames(process.stdout, out_w * out_h * 3, out_w, out_h, frame_count)
+        finally:
+            process.stdout.close()
+            process.wait()
+            stderr_thread.join()
+
+        total = sum(c.shape[0] for c in chunks)
+        profile_count("frames", total)
+        fps = src_fps / stride if src_fps else 0.0
+        if total == 0:
+            print(f"MatrixVideoLoader Error: No frames decoded from {path}\n" + "\n".join(log_tail))
+            return (cast_precision(torch.zeros((1, 512, 512, 3)), output_precision), 0, fps)
+
+        with phase("convert"):
+            if output_precision == "uint8":
+                images = chunks[0] if len(chunks) == 1 else torch.cat(chunks)
+            else:
+                # 逐 chunk 转换写入预分配的输出，不生成整批中间结果
+                dtype = torch.float16 if output_precision == "fp16" else torch.float32
+                images = torch.empty((total, out_h, out_w, 3), dtype=dtype)
+                start = 0
+                for chunk in chunks:
+                    end = start + chunk.shape[0]
+                    images[start:end].copy_(chunk).div_(255)
+                    start = end
+        return (images, total, fps)
+
+NODE_CLASS_MAPPINGS = {"MatrixVideoCombine": MatrixVideoCombine, "MatrixVideoLoader": MatrixVideoLoader}
+NODE_DISPLAY_NAME_MAPPINGS = {"MatrixVideoCombine": "🧩 Matrix Video Combine | 矩阵-视频合成", "MatrixVideoLoader": "🧩 Matrix Video Loader | 矩阵-视频读取"}
\ No newline at end of file